@@ -0,0 +1,245 @@
+import argparse
+import math
+import os
+import signal
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import List
+from urllib.parse import quote
+
+import pandas as pd
+from rich import print
+
+from .coin_stats import repo_path_from_link
+from .commit_store import CommitStore
+from .repo import write_commits_parquet
+from .scrapers.state import JsonStore
+
+REPO_LIST_PATH = "./notebooks/github_reposv2.csv"
+BATCH_OUTPUT_PATH = "./data/commits"
+# Partition column of the output dataset, one directory per repo
+PARTITION_COLUMN = "repo_path"
+
+
+def repo_key(link: str):
+    """'owner/name' of a link, the same for every spelling of a repo's link"""
+    return repo_path_from_link(link).strip("/")
+
+
+def unique_links(links: List[str]):
+    """First link of every repo, in order, whatever the scheme, `.git` or trailing slash"""
+    by_repo = {}
+    for link in links:
+        by_repo.setdefault(repo_key(link), link)
+    return list(by_repo.values())
+
+
+def read_repo_links(csv_path: str = REPO_LIST_PATH, column: str = "github_links_list"):
+    """Unique GitHub links of a repo list, in file order"""
+    links = pd.read_csv(csv_path, usecols=[column])[column].dropna().str.strip()
+    return unique_links(link for link in links if link)
+
+
+def partition_path(output_path: str, repo_path: str):
+    """Hive-style `repo_path=<owner%2Fname>` directory of a repo in the dataset"""
+    return os.path.join(output_path, f"{PARTITION_COLUMN}={quote(repo_path, safe='')}")
+
+
+def _on_timeout(signum, frame):
+    raise TimeoutError("repo timed out")
+
+
+def _scrape_repo(link: str, output_path: str, store_path: str, timeout: float):
+    """Worker: history of one repo written to its partition, within `timeout` seconds
+
+    Runs in its own process, the alarm interrupts a stuck clone/fetch or a
+    traversal too long and the git subprocesses are killed on the way out.
+    """
+    signal.signal(signal.SIGALRM, _on_timeout)
+    signal.alarm(max(1, math.ceil(timeout)) if timeout else 0)
+    try:
+        history = CommitStore(store_path).get_history(link, backend="git")
+    finally:
+        signal.alarm(0)
+    partition = partition_path(output_path, repo_key(link))
+    os.makedirs(partition, exist_ok=True)
+    file = os.path.join(partition, "commits.parquet")
+    write_commits_parquet(history, f"{file}.tmp")
+    os.replace(f"{file}.tmp", file)
+    return len(history), history["hash"].iloc[-1] if len(history) > 0 else None
+
+
+class BatchCommitScraper:
+    """Scrapes the commit histories of many repos into one partitioned dataset
+
+    Repos are spread over a pool of processes, each repo bounded by `timeout`
+    seconds. Failed repos are retried up to `retries` times with an exponential
+    backoff. Every outcome is checkpointed in a manifest next to the dataset, so
+    a killed job started again skips the repos already done. Repos are keyed by
+    their 'owner/name', so two spellings of a link are one job; histories are
+    cloned and traversed incrementally through a `CommitStore`, so scraping
+    again with `refresh=True` only traverses new commits.
+
+    Parameters
+    -------
+    output_path: str
+        root of the dataset, `repo_path=<owner%2Fname>/commits.parquet` per repo
+    store_path: str
+        directory of the `CommitStore` keeping the clones
+    max_workers: int
+        repos scraped at once
+    timeout: float
+        seconds allowed per repo and attempt
+    retries: int
+        attempts after the first one before a repo is marked failed
+    backoff: float
+        seconds before the first retry, doubled at every attempt
+    """
+
+    def __init__(
+        self,
+        output_path: str = BATCH_OUTPUT_PATH,
+        store_path: str = "./data/cache/commits",
+        max_workers: int = None,
+        timeout: float = 1800,
+        retries: int = 2,
+        backoff: float = 30,
+    ):
+        os.makedirs(output_path, exist_ok=True)
+        self.output_path = output_path
+        self.store_path = store_path
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        # Leading underscore: ignored by Parquet dataset readers
+        self.manifest = JsonStore(os.path.join(output_path, "_manifest.sqlite"), "repos")
+
+    def pending(self, links: List[str], refresh: bool = False):
+        """Links of the repos still to scrape, all of them with `refresh`"""
+        links = unique_links(links)
+        if refresh:
+            return links
+        manifest = self.manifest.items()
+        return [
+            link
+            for link in links
+            if manifest.get(repo_key(link), {}).get("status") != "done"
+        ]
+
+    def run(self, links: List[str], refresh: bool = False):
+        """
+        Scrapes `links`, skipping the ones the manifest has as done.
+
+        Returns
+        -------
+        dict
+            number of repos per final status
+        """
+        queue = [(link, 0, 0.0) for link in self.pending(links, refresh)]
+        print(
+            f"{len(queue)} of {len(unique_links(links))} repos to scrape with {self.max_workers} workers"
+        )
+        counts = {"done": 0, "failed": 0}
+        running = {}
+        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            while queue or running:
+                now = time.time()
+                ready = [job for job in queue if job[2] <= now]
+                for job in ready[: self.max_workers - len(running)]:
+                    queue.remove(job)
+                    future = executor.submit(
+                        _scrape_repo, job[0], self.output_path, self.store_path, self.timeout
+                    )
+                    running[future] = job
+                if not running:
+                    time.sleep(max(0.0, min(job[2] for job in queue) - now))
+                    continue
+
+                finished, _ = wait(running, timeout=1, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    link, attempt, _ = running.pop(future)
+                    try:
+                        n_commits, last_hash = future.result()
+                    except Exception as e:
+                        error = f"{type(e).__name__}: {e}"
+                        if attempt < self.retries:
+                            delay = self.backoff * 2**attempt
+                            print(f"[yellow]{link} failed ({error}), retrying in {delay:.0f}s")
+                            self.manifest.put(
+                                repo_key(link),
+                                {
+                                    "status": "retryable",
+                                    "link": link,
+                                    "attempts": attempt + 1,
+                                    "error": error,
+                                },
+                            )
+                            queue.append((link, attempt + 1, time.time() + delay))
+                        else:
+                            print(f"[red]{link} failed after {attempt + 1} attempts: {error}")
+                            self.manifest.put(
+                                repo_key(link),
+                                {
+                                    "status": "failed",
+                                    "link": link,
+                                    "attempts": attempt + 1,
+                                    "error": error,
+                                },
+                            )
+                            counts["failed"] += 1
+                        continue
+                    self.manifest.put(
+                        repo_key(link),
+                        {
+                            "status": "done",
+                            "link": link,
+                            "attempts": attempt + 1,
+                            "n_commits": n_commits,
+                            "last_hash": last_hash,
+                        },
+                    )
+                    counts["done"] += 1
+                    print(f"✔️ {link}: {n_commits} commits")
+        return counts
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        description="Scrape the commit histories of a list of repos into a partitioned Parquet dataset",
+        formatter_class=argparse.RawTextHelpFormatter,
+    )
+    parser.add_argument(
+        "repo_list", nargs="?", default=REPO_LIST_PATH, help="CSV file listing the repos"
+    )
+    parser.add_argument(
+        "-c", "--column", default="github_links_list", help="Column holding the repo links"
+    )
+    parser.add_argument(
+        "-o", "--output-path", default=BATCH_OUTPUT_PATH, help="Root of the output dataset"
+    )
+    parser.add_argument("-w", "--workers", type=int, help="Repos scraped at once")
+    parser.add_argument(
+        "--timeout", type=float, default=1800, help="Seconds allowed per repo and attempt"
+    )
+    parser.add_argument(
+        "--retries", type=int, default=2, help="Attempts after the first one"
+    )
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        help="Scrape the repos already done again, only their new commits are traversed",
+    )
+    parsed_args = parser.parse_args()
+
+    scraper = BatchCommitScraper(
+        parsed_args.output_path,
+        max_workers=parsed_args.workers,
+        timeout=parsed_args.timeout,
+        retries=parsed_args.retries,
+    )
+    counts = scraper.run(
+        read_repo_links(parsed_args.repo_list, parsed_args.column), parsed_args.refresh
+    )
+    print(f"{counts['done']} repos done, {counts['failed']} failed 🥳")
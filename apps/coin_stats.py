@@ -0,0 +1,191 @@
+import argparse
+import json
+import os
+import re
+from typing import Dict, List
+from urllib.parse import urlparse
+
+import numpy as np
+import pandas as pd
+from rich import print
+from rich.progress import track
+
+from .queries import STATS_SUM_COLUMNS, bigquery_parameters, repo_stats_query
+
+COIN_STATS_PATH = "./data/coin_stats"
+COIN_STATS_TABLES = ["weekly", "repos", "stargazers"]
+
+
+def repo_path_from_link(link: str) -> str:
+    """'owner/name' of a GitHub link, the way the stats table keys repos"""
+    return str(urlparse(re.sub(r"\.git", "", link)).path)[1:]
+
+
+def add_cumulative_totals(weekly: pd.DataFrame) -> pd.DataFrame:
+    """Add a running `cum_<column>` next to every summed column of per-week totals"""
+    weekly = weekly.sort_values("week").reset_index(drop=True)
+    for column in STATS_SUM_COLUMNS:
+        weekly[f"cum_{column}"] = weekly[column].cumsum()
+    return weekly
+
+
+def weekly_totals(stats_df: pd.DataFrame) -> pd.DataFrame:
+    """Raw per-repo weekly rows summed per week, with cumulative sums"""
+    weekly = (
+        stats_df.dropna(subset=["week"])
+        .groupby("week")[STATS_SUM_COLUMNS]
+        .sum()
+        .reset_index()
+    )
+    return add_cumulative_totals(weekly)
+
+
+def repo_totals(stats_df: pd.DataFrame) -> pd.DataFrame:
+    """Whole-history totals of every repo, most starred first"""
+    totals = stats_df.groupby("repo_path")[STATS_SUM_COLUMNS].sum()
+    return totals.sort_values(by="stargazer_size", ascending=False).reset_index()
+
+
+def stargazers_by_repo(stats_df: pd.DataFrame) -> pd.DataFrame:
+    """New and cumulative stargazers of every repo per week
+
+    Weeks with stars but no commit activity have no `week`, their `starred_at`
+    is the same weekly bin.
+    """
+    stars = pd.DataFrame(
+        {
+            "repo_path": stats_df["repo_path"].astype(str),
+            "week": pd.to_datetime(stats_df["week"]).fillna(
+                pd.to_datetime(stats_df["starred_at"])
+            ),
+            "stargazer_size": stats_df["stargazer_size"].fillna(0),
+        }
+    )
+    stars = stars.dropna(subset=["week"]).sort_values(["repo_path", "week"])
+    stars["stargazer_cumsum"] = stars.groupby("repo_path")["stargazer_size"].cumsum()
+    return stars.reset_index(drop=True)
+
+
+def aggregate_coin_stats(stats_df: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+    """Everything the Home page charts of a coin need, from its raw weekly rows"""
+    return {
+        "weekly": weekly_totals(stats_df),
+        "repos": repo_totals(stats_df),
+        "stargazers": stargazers_by_repo(stats_df),
+    }
+
+
+def coin_repo_paths(
+    coin_file_path: str = "./data/coin_socials.json",
+    pkl_path: str = "./data/merged_on_name_cg_agg.pkl",
+) -> Dict[str, List[str]]:
+    """Repo paths of every coin, keyed by CoinGecko id (same sources as `load_coingecko_data`)"""
+    with open(coin_file_path, "r") as file:
+        coins_df = pd.DataFrame.from_dict(json.load(file), orient="index")
+    additional_repo_info_df = pd.read_pickle(pkl_path)
+    merged = pd.merge(
+        coins_df[["id", "name"]],
+        additional_repo_info_df[["name_coingecko", "github_repos_complete"]],
+        left_on="name",
+        right_on="name_coingecko",
+        how="inner",
+    )
+    return {
+        coin_id: [repo_path_from_link(link) for link in links]
+        for coin_id, links in zip(merged["id"], merged["github_repos_complete"])
+        if isinstance(links, (list, np.ndarray)) and len(links) > 0
+    }
+
+
+def _coin_stats_file(path: str, table: str, coin_id: str):
+    return os.path.join(path, table, f"{coin_id}.parquet")
+
+
+def materialize_coin_stats(
+    stats_df: pd.DataFrame,
+    repos_by_coin: Dict[str, List[str]],
+    path: str = COIN_STATS_PATH,
+) -> int:
+    """Write the aggregates of every coin, one small Parquet file per coin and table
+
+    Returns
+    -------
+    int
+        number of coins written, coins without any stats rows are skipped
+    """
+    for table in COIN_STATS_TABLES:
+        os.makedirs(os.path.join(path, table), exist_ok=True)
+    rows_by_repo = dict(tuple(stats_df.groupby("repo_path", sort=False)))
+    n_written = 0
+    for coin_id, repo_paths in track(
+        list(repos_by_coin.items()), description="Materializing coin stats..."
+    ):
+        frames = [
+            rows_by_repo[repo_path]
+            for repo_path in dict.fromkeys(repo_paths)
+            if repo_path in rows_by_repo
+        ]
+        if len(frames) == 0:
+            continue
+        coin_stats = aggregate_coin_stats(pd.concat(frames, ignore_index=True))
+        for table, frame in coin_stats.items():
+            file = _coin_stats_file(path, table, coin_id)
+            frame.to_parquet(f"{file}.tmp", index=False)
+            os.replace(f"{file}.tmp", file)
+        n_written += 1
+    return n_written
+
+
+def load_coin_stats(coin_id: str, path: str = COIN_STATS_PATH):
+    """Materialized aggregates of a coin, None if the job has not written them"""
+    try:
+        return {
+            table: pd.read_parquet(_coin_stats_file(path, table, coin_id))
+            for table in COIN_STATS_TABLES
+        }
+    except (OSError, ValueError):
+        return None
+
+
+def read_stats_bigquery(repo_paths: List[str], client=None) -> pd.DataFrame:
+    """Weekly rows of `repo_paths` from the warehouse, in a single query"""
+    from google.cloud import bigquery
+
+    client = client or bigquery.Client()
+    query, params = repo_stats_query(repo_paths)
+    job_config = bigquery.QueryJobConfig(query_parameters=bigquery_parameters(params))
+    return client.query(query, job_config=job_config).result().to_dataframe()
+
+
+def read_stats_sqlite(repo_paths: List[str], sqlite_path: str) -> pd.DataFrame:
+    """Weekly rows of `repo_paths` from the local stand-in written by `SqliteStatsLoader`"""
+    from .scrapers.stats_loader import SqliteStatsLoader
+
+    stats_df = SqliteStatsLoader(sqlite_path).read()
+    return stats_df[stats_df["repo_path"].isin(set(repo_paths))]
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        description="Precompute the per-coin weekly stats read by the Home page",
+        formatter_class=argparse.RawTextHelpFormatter,
+    )
+    parser.add_argument(
+        "--sqlite",
+        help="Read the stats from this SqliteStatsLoader file instead of BigQuery",
+    )
+    parser.add_argument(
+        "-o", "--output-path", default=COIN_STATS_PATH, help="Directory of the output files"
+    )
+    parsed_args = parser.parse_args()
+
+    repos_by_coin = coin_repo_paths()
+    all_repo_paths = sorted({p for paths in repos_by_coin.values() for p in paths})
+    print(f"Reading stats of {len(all_repo_paths)} repos for {len(repos_by_coin)} coins")
+    if parsed_args.sqlite:
+        stats_df = read_stats_sqlite(all_repo_paths, parsed_args.sqlite)
+    else:
+        stats_df = read_stats_bigquery(all_repo_paths)
+    n_written = materialize_coin_stats(stats_df, repos_by_coin, parsed_args.output_path)
+    print(f"{n_written} coins written to {parsed_args.output_path} 🥳")
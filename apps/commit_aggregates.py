@@ -0,0 +1,174 @@
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+HASHED_COLUMNS = ["hash", "author", "committed_on", "lines_added", "lines_deleted"]
+
+
+def dataset_hash(data: pd.DataFrame) -> str:
+    """Content hash of a commit history, over the columns the rollups read"""
+    hashed = pd.util.hash_pandas_object(data[HASHED_COLUMNS], index=False)
+    return hashlib.sha1(hashed.values.tobytes()).hexdigest()
+
+
+class CommitHistoryAggregates:
+    """Daily, weekly, monthly and per-author rollups of a commit history
+
+    Computed once with `np.bincount` over day offsets from the first commit,
+    so every chart of the repo page reads the same arrays instead of running
+    its own `pd.Grouper` pass. Bins match `pd.Grouper(key="committed_on",
+    freq=...)`: every day/week/month between the first and last commit is
+    present, empty ones with 0.
+
+    Use `CommitHistoryAggregates.of(data)` to share instances between reruns.
+
+    Parameters
+    -------
+    data: pd.DataFrame
+        commit history as returned by `utils.get_repo_data`
+    """
+
+    _cache = OrderedDict()
+    cache_size = 8
+
+    def __init__(self, data: pd.DataFrame):
+        days = data["committed_on"].values.astype("datetime64[D]")
+        self.n_commits = len(days)
+        self.first_day = days.min() if self.n_commits > 0 else np.datetime64(0, "D")
+        day_offsets = (days - self.first_day).astype(np.int64)
+        n_days = day_offsets.max() + 1 if self.n_commits > 0 else 0
+        self.days = self.first_day + np.arange(n_days)
+        lines_added = data["lines_added"].to_numpy(dtype=np.float64)
+        lines_deleted = data["lines_deleted"].to_numpy(dtype=np.float64)
+
+        self.daily_commits = np.bincount(day_offsets, minlength=n_days)
+        self.daily_lines_added = np.bincount(
+            day_offsets, weights=lines_added, minlength=n_days
+        ).astype(np.int64)
+        self.daily_lines_deleted = np.bincount(
+            day_offsets, weights=lines_deleted, minlength=n_days
+        ).astype(np.int64)
+
+        # Months as offsets from the first commit's month
+        self.first_month = self.first_day.astype("datetime64[M]")
+        self._day_months = (self.days.astype("datetime64[M]") - self.first_month).astype(
+            np.int64
+        )
+        self.n_months = self._day_months[-1] + 1 if n_days > 0 else 0
+
+        # Authors, in order of appearance like `Series.unique`
+        author_codes, self.authors = pd.factorize(data["author"])
+        self.author_commits = np.bincount(author_codes, minlength=len(self.authors))
+        author_months = author_codes * self.n_months + self._day_months[day_offsets]
+        shape = (len(self.authors), self.n_months)
+        self.author_monthly_commits = np.bincount(
+            author_months, minlength=shape[0] * shape[1]
+        ).reshape(shape)
+        self.author_monthly_lines_added = (
+            np.bincount(author_months, weights=lines_added, minlength=shape[0] * shape[1])
+            .reshape(shape)
+            .astype(np.int64)
+        )
+
+    @classmethod
+    def of(cls, data: pd.DataFrame):
+        """Aggregates of `data`, reused while the same dataset is rendered again"""
+        key = dataset_hash(data)
+        if key in cls._cache:
+            cls._cache.move_to_end(key)
+            return cls._cache[key]
+        aggregates = cls(data)
+        cls._cache[key] = aggregates
+        if len(cls._cache) > cls.cache_size:
+            cls._cache.popitem(last=False)
+        return aggregates
+
+    def _month_ends(self, n_months: int, start: int = 0):
+        """`freq="M"` labels (last day of the month) of month offsets [start, start + n_months)"""
+        months = self.first_month + np.arange(start, start + n_months)
+        return (months + 1).astype("datetime64[D]") - 1
+
+    def daily(self) -> pd.DataFrame:
+        """Commits (`hash`) and lines added/deleted per day"""
+        return pd.DataFrame(
+            {
+                "committed_on": pd.to_datetime(self.days),
+                "hash": self.daily_commits,
+                "lines_added": self.daily_lines_added,
+                "lines_deleted": self.daily_lines_deleted,
+            }
+        )
+
+    def weekly(self) -> pd.DataFrame:
+        """Commits and lines added/deleted per week, labelled by the closing Sunday"""
+        if len(self.days) == 0:
+            return self.daily()
+        # 1970-01-01 was a Thursday, so Monday-based weeks start 3 days later
+        week_of_day = (self.days.astype(np.int64) + 3) // 7
+        week_offsets = week_of_day - week_of_day[0]
+        n_weeks = week_offsets[-1] + 1
+        first_sunday = self.days[0] + (6 - (self.days[0].astype(np.int64) + 3) % 7)
+        return pd.DataFrame(
+            {
+                "committed_on": pd.to_datetime(
+                    first_sunday + 7 * np.arange(n_weeks)
+                ),
+                "hash": np.bincount(week_offsets, weights=self.daily_commits).astype(np.int64),
+                "lines_added": np.bincount(week_offsets, weights=self.daily_lines_added).astype(np.int64),
+                "lines_deleted": np.bincount(week_offsets, weights=self.daily_lines_deleted).astype(np.int64),
+            }
+        )
+
+    def monthly(self) -> pd.DataFrame:
+        """Commits and lines added/deleted per month, labelled by the month end"""
+        return pd.DataFrame(
+            {
+                "committed_on": pd.to_datetime(self._month_ends(self.n_months)),
+                "hash": np.bincount(
+                    self._day_months, weights=self.daily_commits, minlength=self.n_months
+                ).astype(np.int64),
+                "lines_added": np.bincount(
+                    self._day_months, weights=self.daily_lines_added, minlength=self.n_months
+                ).astype(np.int64),
+                "lines_deleted": np.bincount(
+                    self._day_months, weights=self.daily_lines_deleted, minlength=self.n_months
+                ).astype(np.int64),
+            }
+        )
+
+    def top_contributors(self) -> pd.DataFrame:
+        """Contributors ranked by number of commits"""
+        order = np.argsort(-self.author_commits, kind="stable")
+        return pd.DataFrame(
+            {
+                "author": np.asarray(self.authors)[order],
+                "n_commits": self.author_commits[order],
+            }
+        )
+
+    def cumulative_lines_by_contributor(self, n: int = 20) -> pd.DataFrame:
+        """Monthly running total of lines added by the top-`n` contributors
+
+        Months span the first to the last month any of them committed in.
+        """
+        top_n = self.top_contributors()["author"][:n].tolist()
+        codes = self.authors.get_indexer(top_n)
+        lines_added = self.author_monthly_lines_added[codes]
+        active_months = np.flatnonzero(self.author_monthly_commits[codes].any(axis=0))
+        if len(active_months) == 0:
+            return pd.DataFrame(columns=["author", "committed_on", "lines_added"])
+        start, stop = active_months[0], active_months[-1] + 1
+        cumulative = lines_added[:, start:stop].cumsum(axis=1)
+        order = np.argsort(top_n, kind="stable")
+        n_months = stop - start
+        return pd.DataFrame(
+            {
+                "author": np.repeat(np.asarray(top_n, dtype=object)[order], n_months),
+                "committed_on": np.tile(
+                    pd.to_datetime(self._month_ends(n_months, start)), len(top_n)
+                ),
+                "lines_added": cumulative[order].ravel(),
+            }
+        )
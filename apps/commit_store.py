@@ -0,0 +1,186 @@
+import os
+import re
+import shutil
+import subprocess
+import threading
+from urllib.parse import urlparse
+
+import pandas as pd
+
+from .repo import (
+    CommitTraversalError,
+    get_commit_frame,
+    get_commit_frame_parallel,
+    read_commits_parquet,
+    typed_commit_frame,
+    write_commits_parquet,
+)
+from .scrapers.state import JsonStore
+
+
+def _git(*args, cwd=None):
+    return subprocess.run(
+        ["git", *args], cwd=cwd, check=True, capture_output=True, text=True
+    ).stdout.strip()
+
+
+def select_commits(history, since=None, to=None, first_n_commits=None):
+    """
+    Applies the `get_repo_data` filters to a stored commit history.
+    Args:
+        history (pd.DataFrame): A typed commit history, oldest commit first.
+        since (datetime): Only commits after this date. Defaults to None.
+        to (datetime): Only commits before this date. Defaults to None.
+        first_n_commits (int): Only the first n commits left. Defaults to None.
+    Returns:
+        pd.DataFrame: The matching commits.
+    """
+    mask = pd.Series(True, index=history.index)
+    if since is not None:
+        mask &= history["committed_on"] >= pd.Timestamp(since)
+    if to is not None:
+        mask &= history["committed_on"] <= pd.Timestamp(to)
+    history = history[mask]
+    if first_n_commits:
+        history = history.iloc[:first_n_commits]
+    return history.reset_index(drop=True)
+
+
+class CommitStore:
+    """Persistent clones and commit histories of the repos looked at in the dashboard
+
+    Remote repos are kept as bare clones, and their traversed history as one
+    Parquet file per repo together with the last traversed commit. Later requests
+    only `git fetch` and traverse the commits that are new since then; the
+    `since`/`to`/`first_n_commits` filters are answered from the stored history.
+    A history that was rewritten (force push) is traversed again from scratch.
+
+    Parameters
+    -------
+    path: str
+        directory holding the clones, the histories and the state file
+    max_workers: int
+        processes traversing a history in parallel (see
+        `repo.get_commit_frame_parallel`), 1 traverses in this process
+    """
+
+    def __init__(self, path: str = "./data/cache/commits", max_workers: int = 1):
+        self.path = path
+        self.max_workers = max_workers
+        os.makedirs(os.path.join(path, "clones"), exist_ok=True)
+        os.makedirs(os.path.join(path, "history"), exist_ok=True)
+        self.state = JsonStore(os.path.join(path, "state.sqlite"), table="repos")
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+
+    @staticmethod
+    def _key(repo_path: str):
+        if urlparse(repo_path).scheme:
+            key = urlparse(repo_path).path.strip("/")
+        else:
+            key = os.path.abspath(repo_path).strip(os.sep)
+        return re.sub(r"[^A-Za-z0-9_.-]", "__", re.sub(r"\.git$", "", key))
+
+    def _lock(self, key: str):
+        with self._locks_lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def _history_file(self, key: str):
+        return os.path.join(self.path, "history", f"{key}.parquet")
+
+    def clone_path(self, repo_path: str):
+        """Local clone of `repo_path`, cloned or fetched so it is up to date"""
+        if not urlparse(repo_path).scheme:
+            return repo_path
+        url = repo_path if repo_path.endswith(".git") else repo_path + ".git"
+        clone = os.path.join(self.path, "clones", f"{self._key(repo_path)}.git")
+        if os.path.isdir(clone):
+            _git("fetch", "--prune", "origin", "+refs/heads/*:refs/heads/*", cwd=clone)
+        else:
+            # Cloned aside first, an interrupted clone must not look like a clone
+            shutil.rmtree(f"{clone}.tmp", ignore_errors=True)
+            _git("clone", "--bare", url, f"{clone}.tmp")
+            os.replace(f"{clone}.tmp", clone)
+        return clone
+
+    def _traverse(self, clone: str, only_commits=None, backend: str = "pydriller"):
+        if backend == "pydriller" and self.max_workers > 1:
+            return get_commit_frame_parallel(
+                clone, only_commits=only_commits, max_workers=self.max_workers
+            )
+        return get_commit_frame(clone, only_commits=only_commits, backend=backend)
+
+    @staticmethod
+    def _check_count(commits, expected: int, repo_path: str):
+        if len(commits) != expected:
+            raise CommitTraversalError(
+                f"{len(commits)} of {expected} commits traversed for {repo_path}"
+            )
+
+    def get_history(self, repo_path: str, backend: str = "pydriller"):
+        """
+        Full commit history of a repo, traversing only the commits not stored yet.
+        Args:
+            repo_path (str): A path to a local repository or a link to an hosted one.
+            backend (str): How new commits are traversed, see `repo.get_commit_frame`.
+        Returns:
+            pd.DataFrame: A typed commit history, oldest commit first.
+        Raises:
+            CommitTraversalError: Fewer commits were traversed than git has, the
+                stored history is left as it was.
+        """
+        key = self._key(repo_path)
+        with self._lock(key):
+            clone = self.clone_path(repo_path)
+            head = _git("rev-parse", "HEAD", cwd=clone)
+            last_hash = self.state.get(key, default={}).get("last_hash")
+            history_file = self._history_file(key)
+            history = None
+            if last_hash is not None and os.path.exists(history_file):
+                history = read_commits_parquet(history_file)
+            if history is not None and last_hash == head:
+                return history
+
+            is_ancestor = (
+                history is not None
+                and subprocess.run(
+                    ["git", "merge-base", "--is-ancestor", last_hash, head], cwd=clone
+                ).returncode
+                == 0
+            )
+            if is_ancestor:
+                new_hashes = _git(
+                    "rev-list", "--reverse", f"{last_hash}..{head}", cwd=clone
+                ).split()
+                new_commits = self._traverse(
+                    clone, only_commits=new_hashes, backend=backend
+                )
+                self._check_count(new_commits, len(new_hashes), repo_path)
+                history = typed_commit_frame(
+                    pd.concat([history, new_commits], ignore_index=True)
+                    .drop_duplicates("hash", keep="last")
+                    .reset_index(drop=True)
+                )
+            else:
+                history = self._traverse(clone, backend=backend)
+                self._check_count(
+                    history, int(_git("rev-list", "--count", head, cwd=clone)), repo_path
+                )
+
+            # Only a complete traversal is stored and moves the mark
+            write_commits_parquet(history, history_file)
+            self.state.put(key, {"url": repo_path, "last_hash": head})
+            return history
+
+    def get_commits(
+        self,
+        repo_path: str,
+        since=None,
+        to=None,
+        first_n_commits=None,
+        backend: str = "pydriller",
+    ):
+        """`get_history` filtered like `get_all_commits` would have"""
+        return select_commits(
+            self.get_history(repo_path, backend=backend), since, to, first_n_commits
+        )
@@ -0,0 +1,221 @@
+import argparse
+import ast
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from rich import print
+from scipy import sparse
+
+from .graph_index import GRAPH_COMPACT_PATH, CompactGraph
+
+GRAPH_PATH = "./data/graph"
+GRAPH_PICKLE_PATH = "./data/graph_contributor_edges.pkl"
+# Accounts contributing to everything, they would connect every pair of ecosystems
+IGNORED_CONTRIBUTORS = ["dependabot[bot]", "dependabot-preview[bot]", ""]
+NODE_ATTRIBUTE_COLUMNS = [
+    "repos",
+    "repo_count",
+    "contributors_list",
+    "languages",
+    "stargazers_count",
+    "watchers_count",
+    "forks_count",
+]
+# Summed per node, "Invalid Repo" in rows of repos that failed to scrape
+REPO_COUNT_COLUMNS = ["stargazers_count", "watchers_count", "forks_count"]
+
+
+def contributor_logins(value):
+    """Contributor logins of a scraped repo, from a list or its string repr
+
+    The scraped `contributors` column holds the repr of a `{"login": [...]}`
+    dict, already parsed lists are returned as is. None when the value can't be
+    parsed, like the "Invalid Repo" of repos that failed to scrape.
+    """
+    if isinstance(value, str):
+        try:
+            value = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            return None
+    if isinstance(value, dict):
+        value = value["login"]
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return []
+    return list(value)
+
+
+def token_graph_nodes(repos_df: pd.DataFrame) -> pd.DataFrame:
+    """One row per ecosystem (token name) with the attributes of the graph nodes
+
+    Parameters
+    -------
+    repos_df: pd.DataFrame
+        one row per scraped repo with `name`, `repo`, `contributors` (or
+        `contributors_list`), `language`, `stargazers_count`, `watchers_count`
+        and `forks_count`. Repos whose contributors can't be parsed are skipped.
+    """
+    if "contributors_list" not in repos_df:
+        contributors = repos_df["contributors"].map(contributor_logins)
+        repos_df = repos_df[contributors.notna()].assign(
+            contributors_list=contributors[contributors.notna()]
+        )
+    repos_df = repos_df.assign(
+        **{
+            column: pd.to_numeric(repos_df[column], errors="coerce").fillna(0).astype(np.int64)
+            for column in REPO_COUNT_COLUMNS
+        }
+    )
+    ignored = set(IGNORED_CONTRIBUTORS)
+    grouped = repos_df.groupby("name")
+    nodes = pd.DataFrame(
+        {
+            "repos": grouped["repo"].agg(lambda x: list(set(x))),
+            "repo_count": grouped["repo"].size(),
+            "contributors_list": grouped["contributors_list"].agg(
+                lambda x: list({login for logins in x for login in logins} - ignored)
+            ),
+            "languages": grouped["language"].agg(lambda x: list(set(x))),
+            "stargazers_count": grouped["stargazers_count"].sum(),
+            "watchers_count": grouped["watchers_count"].sum(),
+            "forks_count": grouped["forks_count"].sum(),
+        }
+    )
+    nodes.index.name = "name"
+    return nodes
+
+
+def contributor_incidence(contributors: pd.Series) -> sparse.csr_matrix:
+    """Binary node-by-contributor matrix of the contributor lists, one row per node"""
+    exploded = contributors.reset_index(drop=True).explode().dropna()
+    contributor_codes, logins = pd.factorize(exploded)
+    incidence = sparse.csr_matrix(
+        (
+            np.ones(len(contributor_codes), dtype=np.int32),
+            (exploded.index.to_numpy(), contributor_codes),
+        ),
+        shape=(len(contributors), len(logins)),
+    )
+    # A login listed twice for a node would otherwise count twice
+    incidence.data[:] = 1
+    return incidence
+
+
+def contributor_overlaps(contributors: pd.Series) -> pd.DataFrame:
+    """Number of contributors shared by every pair of nodes sharing any
+
+    Computed as the upper triangle of `A @ A.T`, A being the node-by-contributor
+    incidence matrix, instead of intersecting the contributor sets pairwise.
+
+    Returns
+    -------
+    pd.DataFrame
+        `src` < `dst` node positions in `contributors` and the shared count
+        `weight`, one row per undirected edge
+    """
+    incidence = contributor_incidence(contributors)
+    overlaps = sparse.triu(incidence @ incidence.T, k=1).tocoo()
+    edges = pd.DataFrame(
+        {
+            "src": overlaps.row.astype(np.int32),
+            "dst": overlaps.col.astype(np.int32),
+            "weight": overlaps.data.astype(np.int32),
+        }
+    )
+    return edges[edges["weight"] > 0].sort_values(["src", "dst"]).reset_index(drop=True)
+
+
+def build_contributor_graph(repos_df: pd.DataFrame):
+    """Nodes and contributor-overlap edges of the ecosystem graph
+
+    Returns
+    -------
+    Tuple[pd.DataFrame, pd.DataFrame]
+        nodes indexed by name, edges between node positions
+    """
+    nodes = token_graph_nodes(repos_df)
+    edges = contributor_overlaps(nodes["contributors_list"])
+    return nodes, edges
+
+
+def write_graph(nodes: pd.DataFrame, edges: pd.DataFrame, path: str = GRAPH_PATH):
+    """Graph as two Parquet files, edges referring to nodes by position"""
+    os.makedirs(path, exist_ok=True)
+    nodes.reset_index().to_parquet(os.path.join(path, "nodes.parquet"), index=False)
+    edges.to_parquet(os.path.join(path, "edges.parquet"), index=False)
+
+
+def read_graph(path: str = GRAPH_PATH):
+    """Nodes and edges written by `write_graph`"""
+    nodes = pd.read_parquet(os.path.join(path, "nodes.parquet")).set_index("name")
+    edges = pd.read_parquet(os.path.join(path, "edges.parquet"))
+    return nodes, edges
+
+
+def to_networkx(nodes: pd.DataFrame, edges: pd.DataFrame):
+    """`nx.Graph` with the node attributes and `weight` edges the graph page reads"""
+    import networkx as nx
+
+    graph = nx.Graph()
+    records = nodes[NODE_ATTRIBUTE_COLUMNS].to_dict("records")
+    for name, attributes in zip(nodes.index, records):
+        for column in ["repos", "contributors_list", "languages"]:
+            attributes[column] = list(attributes[column])
+        graph.add_node(name, **attributes)
+    names = nodes.index.to_numpy()
+    graph.add_edges_from(
+        (names[src], names[dst], {"weight": int(weight)})
+        for src, dst, weight in zip(edges["src"], edges["dst"], edges["weight"])
+    )
+    return graph
+
+
+def _read_repos(path: str) -> pd.DataFrame:
+    if path.endswith(".parquet"):
+        return pd.read_parquet(path)
+    return pd.read_csv(path)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        description="Build the ecosystem graph weighted by shared contributors",
+        formatter_class=argparse.RawTextHelpFormatter,
+    )
+    parser.add_argument(
+        "repos_path",
+        help="""CSV or Parquet file of scraped repos (name, repo, contributors,
+        language, stargazers_count, watchers_count, forks_count)""",
+    )
+    parser.add_argument(
+        "-o", "--output-path", default=GRAPH_PATH, help="Directory of the output files"
+    )
+    parser.add_argument(
+        "--compact",
+        nargs="?",
+        const=GRAPH_COMPACT_PATH,
+        help="Also write the memory-mapped graph read by the graph page",
+    )
+    parser.add_argument(
+        "--gpickle",
+        nargs="?",
+        const=GRAPH_PICKLE_PATH,
+        help="Also write the networkx pickle read by the graph page",
+    )
+    parsed_args = parser.parse_args()
+
+    start = time.perf_counter()
+    nodes, edges = build_contributor_graph(_read_repos(parsed_args.repos_path))
+    print(
+        f"{len(nodes)} nodes and {len(edges)} edges built in "
+        f"{time.perf_counter() - start:.1f}s"
+    )
+    write_graph(nodes, edges, parsed_args.output_path)
+    if parsed_args.compact:
+        CompactGraph.from_frames(nodes, edges).save(parsed_args.compact)
+    if parsed_args.gpickle:
+        import networkx as nx
+
+        nx.write_gpickle(to_networkx(nodes, edges), parsed_args.gpickle)
+    print(f"Graph written to {parsed_args.output_path} 🥳")
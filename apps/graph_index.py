@@ -0,0 +1,344 @@
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+GRAPH_COMPACT_PATH = "./data/graph_compact"
+# Numeric node attributes kept in the compact format, next to `repos`
+NODE_COUNT_COLUMNS = ["stargazers_count", "forks_count", "watchers_count", "repo_count"]
+
+
+def _save_arrays(path: str, arrays: dict):
+    os.makedirs(path, exist_ok=True)
+    for name, array in arrays.items():
+        np.save(os.path.join(path, f"{name}.npy"), array)
+
+
+def _load_arrays(path: str, names: list, mmap_mode="r"):
+    arrays = {}
+    for name in names:
+        file = os.path.join(path, f"{name}.npy")
+        try:
+            arrays[name] = np.load(file, mmap_mode=mmap_mode)
+        except ValueError:
+            # Empty arrays can't be mapped
+            arrays[name] = np.load(file)
+    return arrays
+
+
+def _string_table(strings: list):
+    """UTF-8 bytes of `strings` back to back, string i spanning offsets[i]:offsets[i + 1]"""
+    encoded = [string.encode("utf-8") for string in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(string) for string in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def _sorted_rows(indptr, indices, weights):
+    """Rows of a CSR adjacency reordered by decreasing weight, ties kept in order"""
+    rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+    order = np.lexsort((np.arange(len(weights)), -weights.astype(np.int64), rows))
+    return indices[order], weights[order]
+
+
+class NeighborIndex:
+    """Nearest neighbors and star ranking of the graph nodes, precomputed once
+
+    The adjacency is kept as CSR arrays whose rows are sorted by decreasing
+    edge weight, so the n nearest nodes of a node are the first n entries of
+    its row. Ties keep the order of the networkx adjacency, the order `knn`
+    used to return them in.
+
+    Parameters
+    -------
+    names: list
+        node names, positions are the ids used by the other arrays
+    indptr: np.ndarray
+        row `i` spans `indices[indptr[i]:indptr[i + 1]]`
+    indices: np.ndarray
+        neighbor ids, heaviest edge first
+    weights: np.ndarray
+        weight of every entry of `indices`
+    star_rank: np.ndarray
+        node ids by decreasing `stargazers_count`
+    """
+
+    ARRAYS = ["indptr", "indices", "weights", "star_rank"]
+
+    def __init__(self, names, indptr, indices, weights, star_rank):
+        self.names = list(names)
+        self.indptr = indptr
+        self.indices = indices
+        self.weights = weights
+        self.star_rank = star_rank
+        self.positions = {name: i for i, name in enumerate(self.names)}
+
+    @staticmethod
+    def _graph_arrays(graph):
+        """Names and sorted CSR arrays of a networkx graph with `weight` edges"""
+        names = list(graph.nodes)
+        positions = {name: i for i, name in enumerate(names)}
+        degrees = np.array([len(graph[name]) for name in names], dtype=np.int64)
+        indptr = np.concatenate([[0], np.cumsum(degrees)])
+        indices = np.fromiter(
+            (positions[neighbor] for _, neighbors in graph.adjacency() for neighbor in neighbors),
+            dtype=np.int32,
+            count=indptr[-1],
+        )
+        weights = np.fromiter(
+            (attrs["weight"] for _, neighbors in graph.adjacency() for attrs in neighbors.values()),
+            dtype=np.int32,
+            count=indptr[-1],
+        )
+        indices, weights = _sorted_rows(indptr, indices, weights)
+        return names, indptr, indices, weights
+
+    @classmethod
+    def from_graph(cls, graph):
+        """Index of a networkx graph with `weight` edges and `stargazers_count` nodes"""
+        names, indptr, indices, weights = cls._graph_arrays(graph)
+        stars = np.array(
+            [attrs["stargazers_count"] for _, attrs in graph.nodes(data=True)], dtype=np.int64
+        )
+        star_rank = np.argsort(-stars, kind="stable").astype(np.int32)
+        return cls(names, indptr, indices, weights, star_rank)
+
+    def __contains__(self, name):
+        return name in self.positions
+
+    def __len__(self):
+        return len(self.names)
+
+    def nearest(self, name, n: int):
+        """Names of the `n` neighbors of `name` sharing the most contributors"""
+        if name not in self.positions:
+            return []
+        start = self.indptr[self.positions[name]]
+        stop = min(start + n, self.indptr[self.positions[name] + 1])
+        return [self.names[i] for i in self.indices[start:stop]]
+
+    def top_by_stars(self, n: int):
+        """Names of the `n` nodes with the most stargazers"""
+        return [self.names[i] for i in self.star_rank[:n]]
+
+
+class CompactGraph(NeighborIndex):
+    """The graph page's graph as memory-mapped arrays instead of a networkx pickle
+
+    A directory of .npy files: the `NeighborIndex` arrays, one array per
+    numeric node attribute and a string table holding the node names and the
+    repos of every node. Loading maps the files read-only, so every Streamlit
+    process shares the same pages and only touches the rows it reads; the
+    networkx graph is materialized for the requested nodes only.
+
+    Parameters
+    -------
+    strings: np.ndarray
+        UTF-8 bytes of every string, names first
+    string_offsets: np.ndarray
+        string i spans `strings[string_offsets[i]:string_offsets[i + 1]]`
+    repos_indptr: np.ndarray
+        repos of node i are `repo_ids[repos_indptr[i]:repos_indptr[i + 1]]`
+    repo_ids: np.ndarray
+        string ids of the repos
+    counts: dict
+        `NODE_COUNT_COLUMNS` arrays
+    """
+
+    ARRAYS = NeighborIndex.ARRAYS + [
+        "strings",
+        "string_offsets",
+        "repos_indptr",
+        "repo_ids",
+    ] + NODE_COUNT_COLUMNS
+
+    def __init__(self, arrays: dict):
+        self.arrays = arrays
+        self.strings = arrays["strings"]
+        self.string_offsets = arrays["string_offsets"]
+        self.repos_indptr = arrays["repos_indptr"]
+        self.repo_ids = arrays["repo_ids"]
+        self.counts = {column: arrays[column] for column in NODE_COUNT_COLUMNS}
+        n_nodes = len(arrays["indptr"]) - 1
+        names = [self.string(i) for i in range(n_nodes)]
+        super().__init__(
+            names, arrays["indptr"], arrays["indices"], arrays["weights"], arrays["star_rank"]
+        )
+
+    @classmethod
+    def _from_columns(cls, names, indptr, indices, weights, repos, counts):
+        strings, string_offsets = _string_table(
+            list(names) + [repo for node_repos in repos for repo in node_repos]
+        )
+        repo_counts = np.array([len(node_repos) for node_repos in repos], dtype=np.int64)
+        repos_indptr = np.concatenate([[0], np.cumsum(repo_counts)])
+        counts = {column: np.asarray(counts[column], dtype=np.int64) for column in NODE_COUNT_COLUMNS}
+        return cls(
+            {
+                "indptr": indptr,
+                "indices": indices,
+                "weights": weights,
+                "star_rank": np.argsort(-counts["stargazers_count"], kind="stable").astype(np.int32),
+                "strings": strings,
+                "string_offsets": string_offsets,
+                "repos_indptr": repos_indptr,
+                "repo_ids": np.arange(len(names), len(names) + repos_indptr[-1], dtype=np.int32),
+                **counts,
+            }
+        )
+
+    @classmethod
+    def from_graph(cls, graph):
+        """Compact copy of the networkx graph pickled by the graph notebook"""
+        names, indptr, indices, weights = cls._graph_arrays(graph)
+        attributes = [attrs for _, attrs in graph.nodes(data=True)]
+        counts = {
+            column: [attrs.get(column, 0) for attrs in attributes] for column in NODE_COUNT_COLUMNS
+        }
+        repos = [list(attrs.get("repos", [])) for attrs in attributes]
+        return cls._from_columns(names, indptr, indices, weights, repos, counts)
+
+    @classmethod
+    def from_frames(cls, nodes, edges):
+        """Compact graph of the nodes and edges built by `contributor_graph`"""
+        n_nodes = len(nodes)
+        # Both directions of every undirected edge, grouped by source
+        src = np.concatenate([edges["src"].to_numpy(), edges["dst"].to_numpy()])
+        dst = np.concatenate([edges["dst"].to_numpy(), edges["src"].to_numpy()])
+        weights = np.concatenate([edges["weight"].to_numpy()] * 2).astype(np.int32)
+        order = np.argsort(src, kind="stable")
+        indptr = np.concatenate([[0], np.cumsum(np.bincount(src, minlength=n_nodes))])
+        indices, weights = _sorted_rows(indptr, dst[order].astype(np.int32), weights[order])
+        return cls._from_columns(
+            nodes.index.tolist(), indptr, indices, weights, nodes["repos"].tolist(), nodes
+        )
+
+    def save(self, path: str = GRAPH_COMPACT_PATH):
+        """Write the arrays to a new directory and point `path` at it
+
+        `path` is a symlink to the current version and is swapped in one rename,
+        so readers see the old graph or the new one, never half a graph or none.
+        Processes converting at the same time each write a directory of their own.
+        """
+        path = os.path.abspath(path)
+        parent, name = os.path.split(path)
+        os.makedirs(parent, exist_ok=True)
+        version = tempfile.mkdtemp(dir=parent, prefix=f".{name}.")
+        # mkdtemp only lets its owner in
+        os.chmod(version, 0o755)
+        try:
+            _save_arrays(version, {array: self.arrays[array] for array in self.ARRAYS})
+        except BaseException:
+            shutil.rmtree(version, ignore_errors=True)
+            raise
+        previous = os.path.realpath(path) if os.path.islink(path) else None
+        if os.path.isdir(path) and not os.path.islink(path):
+            # Plain directory written before `path` became a symlink
+            old_path = tempfile.mkdtemp(dir=parent, prefix=f".{name}.old.")
+            try:
+                os.replace(path, old_path)
+            except OSError:
+                # Already moved aside, or swapped for a symlink, by another process
+                pass
+            shutil.rmtree(old_path, ignore_errors=True)
+            shutil.rmtree(f"{path}.old", ignore_errors=True)
+        link = f"{version}.link"
+        os.symlink(os.path.basename(version), link)
+        os.replace(link, path)
+        if previous is not None and previous != version:
+            # Pages already mapped by readers stay valid once the files are unlinked
+            shutil.rmtree(previous, ignore_errors=True)
+
+    @classmethod
+    def load(cls, path: str = GRAPH_COMPACT_PATH):
+        while True:
+            # Resolved once, so every array comes from the same version
+            version = os.path.realpath(path)
+            try:
+                return cls(_load_arrays(version, cls.ARRAYS))
+            except FileNotFoundError:
+                # Removed while being read, read the version swapped in instead
+                if os.path.realpath(path) == version:
+                    raise
+
+    @classmethod
+    def for_graph(cls, graph_path: str, load_graph, path: str = GRAPH_COMPACT_PATH):
+        """Compact graph at `path`, converted from the pickle when missing or older
+
+        Parameters
+        -------
+        load_graph: callable
+            returns the networkx graph, only called when converting
+        """
+        if os.path.isdir(path) and (
+            not os.path.exists(graph_path)
+            or os.path.getmtime(path) >= os.path.getmtime(graph_path)
+        ):
+            return cls.load(path)
+        cls.from_graph(load_graph()).save(path)
+        return cls.load(path)
+
+    def string(self, i: int) -> str:
+        return bytes(self.strings[self.string_offsets[i] : self.string_offsets[i + 1]]).decode(
+            "utf-8"
+        )
+
+    def repos(self, i: int) -> list:
+        repo_ids = self.repo_ids[self.repos_indptr[i] : self.repos_indptr[i + 1]]
+        return [self.string(repo_id) for repo_id in repo_ids]
+
+    def node_attributes(self, i: int) -> dict:
+        attributes = {column: int(values[i]) for column, values in self.counts.items()}
+        attributes["repos"] = self.repos(i)
+        return attributes
+
+    def subgraph_columns(self, names) -> dict:
+        """Attributes of `names` and the edges between them, as columns
+
+        Nodes come in id order, edges refer to them by position, each once.
+        """
+        ids = sorted({self.positions[name] for name in names if name in self.positions})
+        local = {node_id: position for position, node_id in enumerate(ids)}
+        src, dst, weights = [], [], []
+        for position, i in enumerate(ids):
+            row = slice(self.indptr[i], self.indptr[i + 1])
+            neighbors = np.asarray(self.indices[row])
+            keep = (neighbors > i) & np.isin(neighbors, ids)
+            src.extend([position] * int(keep.sum()))
+            dst.extend(local[j] for j in neighbors[keep].tolist())
+            weights.extend(np.asarray(self.weights[row])[keep].tolist())
+        columns = {
+            "names": [self.names[i] for i in ids],
+            "repos": [self.repos(i) for i in ids],
+            "src": np.array(src, dtype=np.int64),
+            "dst": np.array(dst, dtype=np.int64),
+            "weight": np.array(weights, dtype=np.int64),
+        }
+        for column, values in self.counts.items():
+            columns[column] = np.asarray(values[np.array(ids, dtype=np.int64)])
+        return columns
+
+    def subgraph(self, names):
+        """networkx graph of `names` and the edges between them, read from the arrays"""
+        import networkx as nx
+
+        columns = self.subgraph_columns(names)
+        graph = nx.Graph()
+        graph.add_nodes_from(
+            (
+                name,
+                dict(
+                    {column: int(columns[column][position]) for column in NODE_COUNT_COLUMNS},
+                    repos=columns["repos"][position],
+                ),
+            )
+            for position, name in enumerate(columns["names"])
+        )
+        graph.add_weighted_edges_from(
+            (columns["names"][s], columns["names"][d], w)
+            for s, d, w in zip(
+                columns["src"].tolist(), columns["dst"].tolist(), columns["weight"].tolist()
+            )
+        )
+        return graph
@@ -0,0 +1,207 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from string import Template
+
+import numpy as np
+
+GRAPH_TEMPLATE_PATH = "./components/graph_template.html"
+STYLE_PATH = "./components/style.css"
+# Repos listed in a node's hover text, the others are only counted
+MAX_HOVER_REPOS = 25
+# What pyvis generated for `Network().hrepulsion(central_gravity=0, spring_length=400)`,
+# used when no options are given
+DEFAULT_OPTIONS = {
+    "configure": {"enabled": False},
+    "edges": {"color": {"inherit": True}, "smooth": {"enabled": False, "type": "continuous"}},
+    "interaction": {"dragNodes": True, "hideEdgesOnDrag": False, "hideNodesOnDrag": False},
+    "physics": {
+        "enabled": True,
+        "hierarchicalRepulsion": {
+            "centralGravity": 0,
+            "damping": 0.09,
+            "nodeDistance": 120,
+            "springConstant": 0.01,
+            "springLength": 400,
+        },
+        "solver": "hierarchicalRepulsion",
+        "stabilization": {
+            "enabled": True,
+            "fit": True,
+            "iterations": 1000,
+            "onlyDynamicEdges": False,
+            "updateInterval": 50,
+        },
+    },
+}
+
+# What jinja's `tojson` escapes, so titles can't close the <script> they sit in
+_JSON_ESCAPES = str.maketrans(
+    {"<": "\\u003c", ">": "\\u003e", "&": "\\u0026", "'": "\\u0027"}
+)
+
+
+@lru_cache(maxsize=None)
+def _read(path: str) -> str:
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+def graph_style() -> str:
+    """components/style.css, read once per process"""
+    return _read(STYLE_PATH)
+
+
+def to_script_json(value) -> str:
+    return json.dumps(value).translate(_JSON_ESCAPES)
+
+
+def options_json(options: str = None) -> str:
+    """JSON of a pyvis `var options = {...}` string, `DEFAULT_OPTIONS` if None"""
+    if not options:
+        return json.dumps(DEFAULT_OPTIONS)
+    return json.dumps(json.loads(options[options.find("{") :]))
+
+
+def options_hash(options: str) -> str:
+    return hashlib.sha1(options.encode("utf-8")).hexdigest()
+
+
+def graph_columns(networkx_graph) -> dict:
+    """Node and edge columns of a networkx graph, edges as node positions"""
+    names = list(networkx_graph.nodes)
+    positions = {name: i for i, name in enumerate(names)}
+    attributes = [attrs for _, attrs in networkx_graph.nodes(data=True)]
+    edges = list(networkx_graph.edges(data="weight"))
+    return {
+        "names": names,
+        "stargazers_count": np.array([attrs["stargazers_count"] for attrs in attributes]),
+        "forks_count": np.array([attrs["forks_count"] for attrs in attributes]),
+        "repos": [attrs["repos"] for attrs in attributes],
+        "src": np.array([positions[source] for source, _, _ in edges], dtype=np.int64),
+        "dst": np.array([positions[target] for _, target, _ in edges], dtype=np.int64),
+        "weight": np.array([weight for _, _, weight in edges], dtype=np.int64),
+    }
+
+
+def _repos_html(repos, max_repos: int) -> str:
+    shown = "<br>".join(f'<font size="1">{repo}</font>' for repo in repos[:max_repos])
+    if len(repos) > max_repos:
+        shown += f'<br><font size="1">... and {len(repos) - max_repos} more</font>'
+    return shown
+
+
+def graph_elements(columns: dict, color_node=None, max_repos: int = MAX_HOVER_REPOS):
+    """vis.js node and edge dicts of `graph_columns`-like columns
+
+    Sizes, edge widths and neighbor counts are computed over whole arrays;
+    hover texts list at most `max_repos` repos per node.
+
+    Returns
+    -------
+    Tuple[list, list]
+        nodes and edges, as pyvis would have built them in `draw_graph3`
+    """
+    names = columns["names"]
+    src, dst, weight = columns["src"], columns["dst"], columns["weight"]
+    stars = np.asarray(columns["stargazers_count"], dtype=np.float64)
+    # Repos without stars would get an infinitely small node
+    sizes = np.log10(np.maximum(stars, 1)) * 3
+    neighbors = np.bincount(np.concatenate([src, dst]), minlength=len(names))
+    titles = [
+        f"<h1>{name}</h1>"
+        f" <strong>Stargazers:{n_stars:,.0f}<strong><br>"
+        f" <strong>Forks:{n_forks:,.0f}</strong><br>"
+        " <h2>Repos:</h2><br>"
+        f"{_repos_html(list(repos), max_repos)}"
+        f" <strong>Neighboring Tokens: {n_neighbors}</strong><br>"
+        for name, n_stars, n_forks, repos, n_neighbors in zip(
+            names, stars, columns["forks_count"], columns["repos"], neighbors.tolist()
+        )
+    ]
+    nodes = [
+        {"title": title, "size": size, "id": name, "label": name, "shape": "dot"}
+        for name, title, size in zip(names, titles, sizes.tolist())
+    ]
+    for node in nodes:
+        if node["id"] == color_node:
+            node.update(color="red", opacity=0.3)
+
+    widths = weight / (weight.max() * 2) if len(weight) > 0 else weight
+    edges = [
+        {
+            "weight": w,
+            "width": width,
+            "title": f"<strong>{names[s]} & {names[d]} share {w} git contributors</strong>",
+            "value": f"{names[s]} & {names[d]} share {w} git contributors",
+            "label": f"Shared Contributors={w}",
+            "from": names[s],
+            "to": names[d],
+        }
+        for s, d, w, width in zip(src.tolist(), dst.tolist(), weight.tolist(), widths.tolist())
+    ]
+    return nodes, edges
+
+
+def render_graph_html(
+    nodes, edges, options: str, height="1000px", width="1000px", bgcolor="#ffffff"
+) -> str:
+    """Standalone vis-network page of the nodes and edges, built in memory
+
+    Parameters
+    -------
+    nodes, edges: list
+        vis.js node and edge dicts (`id`/`from`/`to` plus display attributes)
+    options: str
+        vis.js options as JSON
+    """
+    return Template(_read(GRAPH_TEMPLATE_PATH)).substitute(
+        nodes=to_script_json(nodes),
+        edges=to_script_json(edges),
+        options=options,
+        height=height,
+        width=width,
+        bgcolor=bgcolor,
+    )
+
+
+class RenderedGraphCache:
+    """Bounded LRU of rendered graph pages, shared by the sessions of a process
+
+    Keys are (coin, n, options hash), so a repeat view is served without
+    building the subgraph or rendering it again.
+
+    Parameters
+    -------
+    max_entries: int
+        pages kept, the least recently viewed are dropped first
+    """
+
+    def __init__(self, max_entries: int = 64):
+        self.max_entries = max_entries
+        self._pages = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, render) -> str:
+        """Page cached under `key`, calling `render()` to build it when missing"""
+        with self._lock:
+            if key in self._pages:
+                self._pages.move_to_end(key)
+                self.hits += 1
+                return self._pages[key]
+            self.misses += 1
+        html = render()
+        with self._lock:
+            self._pages[key] = html
+            self._pages.move_to_end(key)
+            while len(self._pages) > self.max_entries:
+                self._pages.popitem(last=False)
+        return html
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
@@ -10,8 +10,8 @@ import pandas as pd
 import streamlit as st
 import json
 from .ui import (
+    get_coin_stats,
     get_repo_stats_aggregates,
-    get_repo_stats_history,
     plot_coin_stats,
     plot_stargazers_by_repo,
     plot_lines_stats,
@@ -59,7 +59,7 @@ class MainApp(HydraHeadApp):
             ## HIGH LEVEL STATS
 
             left_col, right_col = st.columns(2)
-            chart_data = get_repo_stats_history(coin_choice, data)
+            coin_stats = get_coin_stats(coin_choice, coin_id, data)
             market_data = get_one_token_latest_market_data(coin_id)
             # st.dataframe(market_data)
             with right_col:
@@ -69,27 +69,27 @@ class MainApp(HydraHeadApp):
                     use_container_width=True,
                 )
 
-            if len(chart_data) > 0:
+            if len(coin_stats["repos"]) > 0:
                 with left_col:
                     st.markdown("### Github Repo Lines & Commits over Time")
 
                     st.altair_chart(
-                        plot_lines_stats(chart_data),
+                        plot_lines_stats(coin_stats["weekly"]),
                         use_container_width=True,
                     )
                     st.altair_chart(
-                        plot_total_commits_(chart_data),
+                        plot_total_commits_(coin_stats["weekly"]),
                         use_container_width=True,
                     )
                 st.markdown("### Github Repo Stargazer counts over Time")
                 st.altair_chart(
-                    plot_stargazers_by_repo(chart_data), use_container_width=True
+                    plot_stargazers_by_repo(coin_stats["stargazers"]), use_container_width=True
                 )
 
             else:
                 st.write("No repo info found.")
             st.markdown("### Github Repo Stats Aggregated")
-            get_repo_stats_aggregates(coin_choice, data)
+            get_repo_stats_aggregates(coin_choice, data, coin_stats["repos"])
         except Exception as e:
             st.image(
                 os.path.join(".", "images", "failure.png"),
@@ -0,0 +1,80 @@
+from datetime import datetime
+from typing import List, Tuple
+
+STATS_TABLE = "steady-voltage-236500.github_repo_commits.github_repo_stats_historyv2"
+
+# Columns the Home page charts read, the list columns are left in the warehouse
+STATS_CHART_COLUMNS = [
+    "repo_path",
+    "starred_at",
+    "stargazer_size",
+    "week",
+    "additions",
+    "deletions",
+    "total_commits",
+]
+STATS_SUM_COLUMNS = ["stargazer_size", "additions", "deletions", "total_commits"]
+
+# Builders return (query, params), params being (name, type, value) triples as a
+# tuple so that it stays hashable for st.experimental_memo
+
+
+def _where(repo_paths: List[str], start: datetime = None, end: datetime = None):
+    """Filter on the repos and, when given, on [start, end) of `week`
+
+    `week` is the column the table is partitioned on, so a date range lets
+    BigQuery skip the other partitions.
+    """
+    conditions = ["repo_path IN UNNEST(@repo_paths)"]
+    params = [("repo_paths", "STRING", tuple(repo_paths))]
+    if start is not None:
+        conditions.append("week >= @start")
+        params.append(("start", "TIMESTAMP", start))
+    if end is not None:
+        conditions.append("week < @end")
+        params.append(("end", "TIMESTAMP", end))
+    return " AND ".join(conditions), params
+
+
+def repo_stats_query(
+    repo_paths: List[str],
+    columns: List[str] = STATS_CHART_COLUMNS,
+    start: datetime = None,
+    end: datetime = None,
+) -> Tuple[str, tuple]:
+    """Weekly rows of `repo_paths`, only with `columns`"""
+    where, params = _where(repo_paths, start, end)
+    query = f"""
+        SELECT {", ".join(columns)}
+        FROM `{STATS_TABLE}`
+        WHERE {where}
+    """
+    return query, tuple(params)
+
+
+def weekly_totals_query(
+    repo_paths: List[str], start: datetime = None, end: datetime = None
+) -> Tuple[str, tuple]:
+    """Stats of `repo_paths` summed per week, one row per week in order"""
+    where, params = _where(repo_paths, start, end)
+    sums = ", ".join(f"SUM({column}) AS {column}" for column in STATS_SUM_COLUMNS)
+    query = f"""
+        SELECT week, {sums}
+        FROM `{STATS_TABLE}`
+        WHERE {where} AND week IS NOT NULL
+        GROUP BY week
+        ORDER BY week
+    """
+    return query, tuple(params)
+
+
+def bigquery_parameters(params: tuple):
+    """BigQuery query parameters of the (name, type, value) triples built here"""
+    from google.cloud import bigquery
+
+    return [
+        bigquery.ArrayQueryParameter(name, type_, list(value))
+        if isinstance(value, tuple)
+        else bigquery.ScalarQueryParameter(name, type_, value)
+        for name, type_, value in params
+    ]
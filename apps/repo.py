@@ -1,23 +1,65 @@
 import argparse
 import csv
 import json
+import os
+import subprocess
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from functools import lru_cache
 from urllib.parse import urlparse
 
+import numpy as np
+import pandas as pd
 from pydriller import Repository
 from tqdm import tqdm
 
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+COMMIT_COLUMNS = [
+    "hash",
+    "author",
+    "committed_on",
+    "authored_on",
+    "lines_added",
+    "lines_deleted",
+    "files_touched",
+    "is_merge",
+    "message",
+]
+# Record (\x1e) and field (\x1f) separators can't appear in names or dates,
+# numstat lines follow the last field
+GIT_LOG_FORMAT = "%x1e%H%x1f%an%x1f%cI%x1f%aI%x1f%P%x1f%B%x1f"
+# First git with `--diff-merges`, older ones repeat merges once per parent with `-m`
+DIFF_MERGES_GIT_VERSION = (2, 31)
+COMMIT_DTYPES = {
+    "author": "category",
+    "lines_added": "int32",
+    "lines_deleted": "int32",
+    "files_touched": "int32",
+    "is_merge": "bool",
+}
 
-def get_all_commits(path, since=None, to=None, first_n_commits=None):
+
+class CommitTraversalError(Exception):
+    """A commit history could not be read completely"""
+
+
+def iter_commits(
+    path, since=None, to=None, first_n_commits=None, only_commits=None, raise_errors=False
+):
     """
-    Grabs all commits and related metadata from a target repository.
+    Yields all commits and related metadata from a target repository.
     Args:
         path (str): A path to a local repository or a link to an hosted one
             (of the format https://github.com/andodet/myrepo.git).
-        since (str): A date string of the format (`%Y-%m-%d`). Defaults to None.
-        to (str):  A date string of the format (`%Y-%m-%d`). Defaults to None.
-    Returns:
-        list: A list of dictionaries of all commits and relative information.
+        since (datetime): Only commits after this date. Defaults to None.
+        to (datetime): Only commits before this date. Defaults to None.
+        first_n_commits (int): Stop after this many commits. Defaults to None.
+        only_commits (list): Only these commit hashes. Defaults to None.
+        raise_errors (bool): Raise a failed traversal instead of stopping early.
+            Defaults to False.
+    Yields:
+        dict: One commit, dates as naive datetimes in the committer's local time.
     """
     # since = datetime.strptime(since, "%Y-%m-%d") if since else None
     # to = datetime.strptime(to, "%Y-%m-%d") if to else None #datetime.now()
@@ -26,18 +68,20 @@ def get_all_commits(path, since=None, to=None, first_n_commits=None):
     if urlparse(path).scheme:
         path += ".git"
 
-    repo = Repository(path, num_workers=10, since=(since), to=to)
+    repo = Repository(
+        path, num_workers=10, since=(since), to=to, only_commits=only_commits
+    )
 
-    res = []
+    n_commits = 0
     try:
         print("Retrieving commits...")
         for commit in tqdm(repo.traverse_commits()):
-            res.append(
+            yield (
                 {
                     "hash": commit.hash,
                     "author": commit.author.name,
-                    "committed_on": commit.committer_date.strftime("%Y-%m-%d %H:%M:%S"),
-                    "authored_on": commit.author_date.strftime("%Y-%m-%d %H:%M:%S"),
+                    "committed_on": commit.committer_date.replace(tzinfo=None),
+                    "authored_on": commit.author_date.replace(tzinfo=None),
                     "lines_added": commit.insertions,
                     "lines_deleted": commit.deletions,
                     "files_touched": commit.files,
@@ -50,41 +94,443 @@ def get_all_commits(path, since=None, to=None, first_n_commits=None):
                     "message": commit.msg,
                 }
             )
+            n_commits += 1
             if first_n_commits:
                 first_n_commits -= 1
                 if first_n_commits == 0:
                     break
-        print(f"✔️ {len(res)} commits downloaded for {path}")
+        print(f"✔️ {n_commits} commits downloaded for {path}")
     except Exception as e:
         print(f"Failed to retrieve repo {path} due to {e}")
+        if raise_errors:
+            raise CommitTraversalError(f"Failed to retrieve repo {path} due to {e}") from e
+
+
+def _parse_git_log_record(record):
+    """Parses one `GIT_LOG_FORMAT` record and its numstat lines into a commit dict"""
+    hash_, author, committed_on, authored_on, parents, rest = record.split("\x1f", 5)
+    message, _, numstat = rest.rpartition("\x1f")
+    lines_added = lines_deleted = files_touched = 0
+    for line in numstat.splitlines():
+        if not line:
+            continue
+        added, deleted, _ = line.split("\t", 2)
+        files_touched += 1
+        # Binary files have "-" instead of line counts
+        if added != "-":
+            lines_added += int(added)
+            lines_deleted += int(deleted)
+    return {
+        "hash": hash_,
+        "author": author,
+        # Wall-clock time in the committer's timezone, like pydriller's dates
+        "committed_on": datetime.fromisoformat(committed_on[:19]),
+        "authored_on": datetime.fromisoformat(authored_on[:19]),
+        "lines_added": lines_added,
+        "lines_deleted": lines_deleted,
+        "files_touched": files_touched,
+        "is_merge": len(parents.split()) > 1,
+        "message": message.strip(),
+    }
+
+
+@lru_cache(maxsize=None)
+def git_version():
+    """
+    Version of the git on the PATH.
+    Returns:
+        tuple: (major, minor) numbers, e.g. (2, 30).
+    """
+    output = subprocess.run(
+        ["git", "--version"], check=True, capture_output=True, text=True
+    ).stdout
+    # "git version 2.30.2", possibly followed by a vendor suffix
+    return tuple(int(part) for part in output.split()[2].split(".")[:2])
+
+
+def iter_commits_git_log(path, since=None, to=None, first_n_commits=None, only_commits=None):
+    """
+    Yields the same commits as `iter_commits`, streamed from `git log --numstat`
+    on a local clone instead of computing every diff through pydriller.
+    Args:
+        path (str): A path to a local repository (bare clones included).
+        Others: Same as `iter_commits`.
+    Yields:
+        dict: One commit, same schema as `iter_commits`.
+    Raises:
+        CommitTraversalError: git log failed, with its error output.
+    """
+    cmd = ["git", "log", "--numstat", f"--format={GIT_LOG_FORMAT}"]
+    # Merges count the changes against their first parent, like pydriller
+    if git_version() >= DIFF_MERGES_GIT_VERSION:
+        cmd.append("--diff-merges=first-parent")
+    else:
+        # One record per parent, first parent first: only the first one is kept
+        cmd.append("-m")
+    if only_commits is not None:
+        cmd += ["--no-walk=unsorted", "--stdin"]
+    else:
+        cmd += ["--reverse", "HEAD"]
+        if since is not None:
+            cmd.append(f"--since={since}")
+        if to is not None:
+            cmd.append(f"--until={to}")
+
+    # A file rather than a pipe, git can't block on a full stderr while stdout is read
+    stderr = tempfile.TemporaryFile(mode="w+", encoding="utf-8", errors="replace")
+    process = subprocess.Popen(
+        cmd,
+        cwd=path,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=stderr,
+        text=True,
+        encoding="utf-8",
+        errors="replace",
+    )
+    # git reads every revision from stdin before it starts writing
+    try:
+        if only_commits is not None:
+            process.stdin.write("\n".join(only_commits) + "\n")
+        process.stdin.close()
+    except BrokenPipeError:
+        # git already exited, its status and error are reported below
+        pass
+
+    n_commits = 0
+    last_hash = None
+    stopped = False
+    record = []
+    try:
+        for line in process.stdout:
+            if line.startswith("\x1e"):
+                if record:
+                    commit = _parse_git_log_record("".join(record))
+                    if commit["hash"] != last_hash:
+                        yield commit
+                        last_hash = commit["hash"]
+                        n_commits += 1
+                    if first_n_commits and n_commits == first_n_commits:
+                        record = []
+                        stopped = True
+                        break
+                record = [line[1:]]
+            else:
+                record.append(line)
+        if record:
+            commit = _parse_git_log_record("".join(record))
+            if commit["hash"] != last_hash:
+                yield commit
+                n_commits += 1
+        if not stopped and process.wait() != 0:
+            stderr.seek(0)
+            raise CommitTraversalError(
+                f"git log failed with status {process.returncode} in {path}: "
+                f"{stderr.read().strip()}"
+            )
+    finally:
+        process.stdout.close()
+        process.kill()
+        process.wait()
+        stderr.close()
+    print(f"✔️ {n_commits} commits read from git log for {path}")
+
+
+def get_all_commits(path, since=None, to=None, first_n_commits=None):
+    """
+    Grabs all commits and related metadata from a target repository.
+    Args:
+        path (str): A path to a local repository or a link to an hosted one
+            (of the format https://github.com/andodet/myrepo.git).
+        since (str): A date string of the format (`%Y-%m-%d`). Defaults to None.
+        to (str):  A date string of the format (`%Y-%m-%d`). Defaults to None.
+    Returns:
+        list: A list of dictionaries of all commits and relative information, dates
+            formatted as `%Y-%m-%d %H:%M:%S` strings.
+    """
+    res = []
+    for commit in iter_commits(path, since, to, first_n_commits):
+        commit["committed_on"] = commit["committed_on"].strftime(DATE_FORMAT)
+        commit["authored_on"] = commit["authored_on"].strftime(DATE_FORMAT)
+        res.append(commit)
     return res
 
 
-def write_dataset(dataset, path, format):
+def typed_commit_frame(data):
     """
-    Exports a commit history in .csv format
+    Casts a commit history to the typed schema used by the dashboard.
     Args:
-        dataset (dict): A dataset returned by `get_all_commits` function.
-        path (:obj:`str`, optional): Path for the output file
-        format (:obj:`str`, optional): Format for the output file (suports 'json'and
-            'csv')
+        data (pd.DataFrame): Commits with the `COMMIT_COLUMNS` columns.
+    Returns:
+        pd.DataFrame: datetime64 dates, categorical author, int32 line/file counts
+            and a bool `is_merge`.
+    """
+    data = data[COMMIT_COLUMNS].astype(COMMIT_DTYPES)
+    for column in ["committed_on", "authored_on"]:
+        if not pd.api.types.is_datetime64_any_dtype(data[column]):
+            data[column] = pd.to_datetime(data[column])
+    return data
+
+
+def get_commit_frame(
+    path, since=None, to=None, first_n_commits=None, only_commits=None, backend="pydriller"
+):
+    """
+    Grabs all commits of a target repository straight into typed columns.
+    Args:
+        backend (str): "pydriller", or "git" to stream `git log --numstat` from a
+            local clone (see `iter_commits_git_log`), which is much faster.
+        Others: Same as `iter_commits`.
+    Returns:
+        pd.DataFrame: A typed commit history (see `typed_commit_frame`).
+    Raises:
+        CommitTraversalError: The history could not be read completely.
+    """
+    if backend == "git":
+        commits = iter_commits_git_log(path, since, to, first_n_commits, only_commits)
+    elif backend == "pydriller":
+        commits = iter_commits(
+            path, since, to, first_n_commits, only_commits, raise_errors=True
+        )
+    else:
+        raise ValueError(f"Unknown commit backend {backend!r}")
+    columns = {column: [] for column in COMMIT_COLUMNS}
+    for commit in commits:
+        for column in COMMIT_COLUMNS:
+            columns[column].append(commit[column])
+    data = pd.DataFrame(
+        {
+            "hash": pd.Series(columns["hash"], dtype=object),
+            "author": pd.Categorical(columns["author"]),
+            "committed_on": pd.to_datetime(columns["committed_on"]),
+            "authored_on": pd.to_datetime(columns["authored_on"]),
+            "lines_added": np.array(columns["lines_added"], dtype=np.int32),
+            "lines_deleted": np.array(columns["lines_deleted"], dtype=np.int32),
+            "files_touched": np.array(columns["files_touched"], dtype=np.int32),
+            "is_merge": np.array(columns["is_merge"], dtype=bool),
+            "message": pd.Series(columns["message"], dtype=object),
+        }
+    )
+    return data
+
+
+def list_commit_hashes(path):
+    """
+    Lists the commits reachable from HEAD of a local clone, in traversal order.
+    Args:
+        path (str): A path to a local repository (bare clones included).
+    Returns:
+        list: Commit hashes, oldest first, as pydriller traverses them.
+    """
+    output = subprocess.run(
+        ["git", "rev-list", "--reverse", "HEAD"],
+        cwd=path,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return output.split()
+
+
+def _check_traversed(data, hashes, path):
+    if len(data) != len(set(hashes)):
+        raise CommitTraversalError(
+            f"{len(data)} of {len(set(hashes))} commits traversed in {path}"
+        )
+    return data
+
+
+def _traverse_shard(args):
+    """
+    Traverses some commits in a throwaway clone of its own. pydriller writes the
+    config of the repo it opens, workers sharing a clone would race on its lock.
+    """
+    path, head, hashes = args
+    with tempfile.TemporaryDirectory() as tmp:
+        clone = os.path.join(tmp, "shard.git")
+        # Shares the objects of `path` instead of copying them
+        subprocess.run(
+            ["git", "clone", "--bare", "--shared", "--quiet", path, clone],
+            check=True,
+            capture_output=True,
+        )
+        subprocess.run(
+            ["git", "update-ref", "--no-deref", "HEAD", head],
+            cwd=clone,
+            check=True,
+            capture_output=True,
+        )
+        return _check_traversed(get_commit_frame(clone, only_commits=hashes), hashes, path)
+
+
+def get_commit_frame_parallel(path, only_commits=None, max_workers=None, min_shard_size=500):
+    """
+    Traverses a local clone in processes, one contiguous range of commits each.
+    Args:
+        path (str): A path to a local repository, every worker traverses a clone
+            sharing its objects.
+        only_commits (list): Only these commit hashes, in traversal order. Defaults
+            to every commit reachable from HEAD.
+        max_workers (int): Number of processes. Defaults to the number of cores.
+        min_shard_size (int): Fewest commits worth a process of their own.
+    Returns:
+        pd.DataFrame: A typed commit history in the same order as a single
+            traversal would give.
+    Raises:
+        CommitTraversalError: A range of commits could not be traversed completely.
+    """
+    path = os.path.abspath(path)
+    hashes = list_commit_hashes(path) if only_commits is None else list(only_commits)
+    max_workers = max_workers or os.cpu_count() or 1
+    n_shards = min(max_workers, -(-len(hashes) // min_shard_size))
+    if n_shards <= 1:
+        return _check_traversed(get_commit_frame(path, only_commits=hashes), hashes, path)
+
+    head = subprocess.run(
+        ["git", "rev-parse", "HEAD"], cwd=path, check=True, capture_output=True, text=True
+    ).stdout.strip()
+    shards = [list(shard) for shard in np.array_split(np.array(hashes), n_shards)]
+    with ProcessPoolExecutor(max_workers=n_shards) as executor:
+        frames = list(
+            executor.map(_traverse_shard, [(path, head, shard) for shard in shards])
+        )
+    data = pd.concat(frames, ignore_index=True).drop_duplicates("hash")
+    return typed_commit_frame(data.reset_index(drop=True))
+
+
+def write_commits_parquet(data, path):
+    """
+    Persists a typed commit history, dtypes (incl. the categorical author) included.
+    Args:
+        data (pd.DataFrame): A typed commit history.
+        path (str): Path of the .parquet file.
+    """
+    typed_commit_frame(data).to_parquet(path, index=False)
+
+
+def read_commits_parquet(path):
+    """
+    Loads a commit history written by `write_commits_parquet`, memory-mapping the
+    file instead of parsing it.
+    Args:
+        path (str or file-like): Path of the .parquet file or an uploaded file.
+    Returns:
+        pd.DataFrame: A typed commit history.
+    """
+    if isinstance(path, str):
+        return pd.read_parquet(path, memory_map=True)
+    return pd.read_parquet(path)
+
+
+EXPORT_FORMATS = ["csv", "json", "jsonl", "parquet"]
+
+
+def _commit_arrow_schema():
+    import pyarrow as pa
+
+    return pa.schema(
+        [
+            ("hash", pa.string()),
+            ("author", pa.dictionary(pa.int32(), pa.string())),
+            ("committed_on", pa.timestamp("ns")),
+            ("authored_on", pa.timestamp("ns")),
+            ("lines_added", pa.int32()),
+            ("lines_deleted", pa.int32()),
+            ("files_touched", pa.int32()),
+            ("is_merge", pa.bool_()),
+            ("message", pa.string()),
+        ]
+    )
+
+
+def _text_row(commit):
+    """Commit dict with its dates as `DATE_FORMAT` strings, for the text formats"""
+    row = {column: commit[column] for column in COMMIT_COLUMNS}
+    for column in ["committed_on", "authored_on"]:
+        if isinstance(row[column], datetime):
+            row[column] = row[column].strftime(DATE_FORMAT)
+    return row
+
+
+def _chunks(commits, chunk_size):
+    chunk = []
+    for commit in commits:
+        chunk.append(commit)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def export_commits(commits, path, format="csv", chunk_size=10000):
+    """
+    Streams commits to a file as they are traversed, holding at most `chunk_size`
+    of them in memory.
+    Args:
+        commits (iterable): Commit dicts, e.g. `iter_commits` or `iter_commits_git_log`.
+        path (str): Path for the output file.
+        format (str): 'csv', 'json' (a single array), 'jsonl' (one commit per
+            line) or 'parquet' (one row group per chunk).
+        chunk_size (int): Commits written at once. Defaults to 10000.
+    Returns:
+        int: Number of commits written. An empty history still writes a valid,
+            empty file.
     """
     format = format.lower()
-    try:
-        with open(path, "w") as f:
+    if format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format {format!r}, use one of {EXPORT_FORMATS}")
+
+    n_commits = 0
+    if format == "parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        schema = _commit_arrow_schema()
+        with pq.ParquetWriter(path, schema) as writer:
+            for chunk in _chunks(commits, chunk_size):
+                frame = typed_commit_frame(pd.DataFrame(chunk, columns=COMMIT_COLUMNS))
+                writer.write_table(
+                    pa.Table.from_pandas(frame, schema=schema, preserve_index=False)
+                )
+                n_commits += len(chunk)
+    else:
+        with open(
+            path, "w", encoding="utf-8", newline="" if format == "csv" else None
+        ) as f:
             if format == "csv":
-                keys = dataset[0].keys()
-                # with open(path, "w") as f:
-                writer = csv.DictWriter(f, keys)
+                writer = csv.DictWriter(f, COMMIT_COLUMNS)
                 writer.writeheader()
-                writer.writerows(dataset)
             elif format == "json":
-                # with open(path, "w") as f:
-                json.dump(dataset, f)
-    except (EnvironmentError) as e:
-        raise e
-    finally:
-        print(f"{path} exported 🥳")
+                f.write("[")
+            for chunk in _chunks(commits, chunk_size):
+                rows = [_text_row(commit) for commit in chunk]
+                if format == "csv":
+                    writer.writerows(rows)
+                elif format == "jsonl":
+                    f.writelines(json.dumps(row) + "\n" for row in rows)
+                else:
+                    f.write(
+                        ("," if n_commits > 0 else "")
+                        + ",".join(json.dumps(row) for row in rows)
+                    )
+                n_commits += len(chunk)
+            if format == "json":
+                f.write("]")
+    print(f"{path} exported with {n_commits} commits 🥳")
+    return n_commits
+
+
+def write_dataset(dataset, path, format):
+    """
+    Exports a commit history held in memory, see `export_commits`.
+    Args:
+        dataset (list): A dataset returned by `get_all_commits` function.
+        path (:obj:`str`, optional): Path for the output file
+        format (:obj:`str`, optional): Format for the output file (supports 'csv',
+            'json', 'jsonl' and 'parquet')
+    """
+    export_commits(iter(dataset), path, format)
 
 
 if __name__ == "__main__":
@@ -98,16 +544,32 @@ if __name__ == "__main__":
         help="""The path of the repo. This can be a path on your machine or a link to
         a hosted service (e.g https://github.com/andodet/myrepo.git)""",
     )
-    parser.add_argument("-f", "--output-format", help="Format of the output file")
+    parser.add_argument(
+        "-f",
+        "--output-format",
+        choices=EXPORT_FORMATS,
+        help="Format of the output file, defaults to the extension of the output path",
+    )
     parser.add_argument("-o", "--output-path", help="Path of the output file")
     parser.add_argument("-s", "--since", help="Start date")
     parser.add_argument("-t", "--to", help="End date")
+    parser.add_argument(
+        "--chunk-size", type=int, default=10000, help="Commits written at once"
+    )
     parsed_args = parser.parse_args()
 
-    commit_list = get_all_commits(
-        parsed_args.repo_path, parsed_args.since, parsed_args.to
-    )
+    since = datetime.strptime(parsed_args.since, "%Y-%m-%d") if parsed_args.since else None
+    to = datetime.strptime(parsed_args.to, "%Y-%m-%d") if parsed_args.to else None
+    commits = iter_commits(parsed_args.repo_path, since, to)
 
-    # Export .csv dataset if requested
+    # Export the dataset while the history is traversed if requested
     if parsed_args.output_path:
-        write_dataset(commit_list, parsed_args.output_path, parsed_args.output_format)
+        output_format = parsed_args.output_format or (
+            os.path.splitext(parsed_args.output_path)[1].lstrip(".") or "csv"
+        )
+        export_commits(
+            commits, parsed_args.output_path, output_format, parsed_args.chunk_size
+        )
+    else:
+        for _ in commits:
+            pass
@@ -6,11 +6,15 @@ import streamlit as st
 from hydralit import HydraHeadApp
 from . import ui
 from . import utils
+from .commit_aggregates import CommitHistoryAggregates
 from .scrapers.scrape_repo_minimal import (
     RepoScraper,
     ScrapeGithubUrl,
     UserProfileGetter,
 )
+from .scrapers.http_cache import HttpCache
+from .scrapers.state import JsonStore
+from .scrapers.token_pool import TokenPool
 
 # from top_github_scraper.utils import ScrapeGithubUrl, UserProfileGetter
 from dotenv import load_dotenv
@@ -18,8 +22,10 @@ import pandas as pd
 
 load_dotenv()
 
-USERNAME = os.getenv("GITHUB_USERNAME_LIVE")
-TOKEN = os.getenv("GITHUB_TOKEN_LIVE")
+# Uses every token in GITHUB_TOKENS_LIVE, or falls back to USERNAME/TOKEN
+TOKEN_POOL = TokenPool.from_env()
+HTTP_CACHE = HttpCache()
+PROFILE_CACHE = JsonStore("./data/cache/github_state.sqlite", table="profiles")
 
 
 class RepoScraperApp(HydraHeadApp):
@@ -31,7 +37,11 @@ class RepoScraperApp(HydraHeadApp):
 
         # Get filters
         filters_container = git_container.expander("Filtering Options")
-        start, end, contributor = ui.get_git_bar(commit_history, filters_container)
+        start, end, contributor = ui.get_git_bar(
+            commit_history,
+            filters_container,
+            CommitHistoryAggregates.of(commit_history),
+        )
 
         # Apply filters
         contributor_stats, q_contrib = utils.get_contributor_stats(
@@ -39,6 +49,8 @@ class RepoScraperApp(HydraHeadApp):
         )
         commit_history = utils.filter_by_date(commit_history, start, end)
         commit_history = utils.filter_by_contributor(commit_history, contributor)
+        # Rolled up once for every chart below
+        aggregates = CommitHistoryAggregates.of(commit_history)
         # Top-level repository stats
         git_container.markdown(
             """
@@ -77,17 +89,17 @@ class RepoScraperApp(HydraHeadApp):
                 pass
 
         git_container.markdown("---")
-        git_container.write(ui.plot_commit_waffle(commit_history))
+        git_container.write(ui.plot_commit_waffle(aggregates))
         with git_container.expander("Changes Overview", expanded=True):
-            git_container.write(ui.plot_daily_contributions(commit_history))
-            git_container.write(ui.plot_inserts_deletions(commit_history))
+            git_container.write(ui.plot_daily_contributions(aggregates))
+            git_container.write(ui.plot_inserts_deletions(aggregates))
 
         with git_container.expander("Contributors Overview", expanded=True):
             git_container.write(
-                ui.plot_top_contributors(utils.get_top_contributors(commit_history))
+                ui.plot_top_contributors(aggregates.top_contributors())
             )
             git_container.write(
-                ui.plot_cumulative_lines_by_contributor(commit_history, 30)
+                ui.plot_cumulative_lines_by_contributor(aggregates, 30)
             )
 
     # This one method that must be implemented in order to be used in a Hydralit application.
@@ -102,7 +114,10 @@ class RepoScraperApp(HydraHeadApp):
             ].values[0]
             repo_choice = st.selectbox("Select a repo", repo_link_choice)
             repo_scraper = RepoScraper(
-                [""], max_n_top_contributors=100, USERNAME=USERNAME, TOKEN=TOKEN
+                [""],
+                max_n_top_contributors=100,
+                token_pool=TOKEN_POOL,
+                http_cache=HTTP_CACHE,
             )
             repo_path = urlparse.urlparse(repo_choice).path
             repo_important_info = repo_scraper._get_repo_information(repo_path)
@@ -112,14 +127,22 @@ class RepoScraperApp(HydraHeadApp):
 
             repo_info_df = pd.DataFrame([repo_important_info])
             contributors_info_df = pd.DataFrame.from_records(contributors_info)
-            user_getter = UserProfileGetter(contributors_info_df.url.tolist())
+            user_getter = UserProfileGetter(
+                contributors_info_df.url.tolist(),
+                token_pool=TOKEN_POOL,
+                http_cache=HTTP_CACHE,
+                max_workers=16,
+                profile_cache=PROFILE_CACHE,
+            )
             users_df = user_getter.get_all_user_profiles()
 
             contributors_users_merged_df = pd.merge(
-                contributors_info_df, users_df, on="login"
+                contributors_info_df, users_df, on="login", how="left"
             )
             keep_cols = [
-                col for col in contributors_users_merged_df.columns if not "url" in col
+                col
+                for col in contributors_users_merged_df.columns
+                if not "url" in col and col not in ("status", "error")
             ]
             contributors_info_df_styled = (
                 contributors_users_merged_df[keep_cols]
@@ -175,11 +198,11 @@ class RepoScraperApp(HydraHeadApp):
                     if submit_button:
                         if input_type == "Filter commits by Date":
                             commit_history = utils.get_repo_data(
-                                repo_choice, since=d
+                                repo_choice, since=d, backend="git"
                             )  # d.strftime("%Y-%m-%d")
                         elif input_type == "Filter commits by n":
                             commit_history = utils.get_repo_data(
-                                repo_choice, first_n_commits=filter_option
+                                repo_choice, first_n_commits=filter_option, backend="git"
                             )
 
                         body = self._body(commit_history, second_container)
@@ -0,0 +1,129 @@
+import os
+import sqlite3
+import threading
+import time
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+
+class HttpCache:
+    """Persistent conditional-request cache for GitHub API GETs
+
+    Responses are stored on disk keyed by URL together with their `ETag` and
+    `Last-Modified` headers. Later requests for the same URL are sent with
+    `If-None-Match`/`If-Modified-Since`; GitHub answers unchanged resources with a
+    304, which does not count against the rate limit, and the cached body is served.
+
+    Parameters
+    -------
+    path: str
+        sqlite file holding the cache
+    max_bytes: int
+        size bound of the stored bodies, least recently used entries are evicted
+        once it is exceeded
+    """
+
+    def __init__(
+        self, path: str = "./data/cache/github_http.sqlite", max_bytes: int = 256 * 2**20
+    ):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS responses (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                body BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )"""
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)"
+        )
+        self._conn.commit()
+        self.size = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()[0]
+
+    def get(self, url: str, session=requests, **kwargs) -> requests.Response:
+        """GET `url` through `session`, revalidating any cached copy"""
+        with self._lock:
+            cached = self._conn.execute(
+                "SELECT etag, last_modified, body FROM responses WHERE url = ?", (url,)
+            ).fetchone()
+        headers = dict(kwargs.pop("headers", None) or {})
+        if cached is not None:
+            etag, last_modified, _ = cached
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+        response = session.get(url, headers=headers, **kwargs)
+
+        if response.status_code == 304 and cached is not None:
+            with self._lock:
+                self.hits += 1
+                self._conn.execute(
+                    "UPDATE responses SET last_access = ? WHERE url = ?",
+                    (time.time(), url),
+                )
+                self._conn.commit()
+            return self._cached_response(response, cached[2])
+
+        with self._lock:
+            self.misses += 1
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if response.status_code == 200 and (etag or last_modified):
+            self._store(url, etag, last_modified, response.content)
+        return response
+
+    @staticmethod
+    def _cached_response(not_modified: requests.Response, body: bytes):
+        """Turn a 304 into a 200 carrying the cached body (and the fresh headers)"""
+        response = requests.Response()
+        response.status_code = 200
+        response._content = body
+        response.headers = CaseInsensitiveDict(not_modified.headers)
+        response.url = not_modified.url
+        response.encoding = "utf-8"
+        response.request = not_modified.request
+        return response
+
+    def _store(self, url: str, etag: str, last_modified: str, body: bytes):
+        with self._lock:
+            previous = self._conn.execute(
+                "SELECT size FROM responses WHERE url = ?", (url,)
+            ).fetchone()
+            self._conn.execute(
+                "REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (url, etag, last_modified, body, len(body), time.time()),
+            )
+            self.size += len(body) - (previous[0] if previous else 0)
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """Drop least recently used entries until the cache fits `max_bytes`"""
+        while self.size > self.max_bytes:
+            rows = self._conn.execute(
+                "SELECT url, size FROM responses ORDER BY last_access LIMIT 100"
+            ).fetchall()
+            if len(rows) == 0:
+                break
+            for url, size in rows:
+                self._conn.execute("DELETE FROM responses WHERE url = ?", (url,))
+                self.size -= size
+                if self.size <= self.max_bytes:
+                    break
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "bytes": self.size}
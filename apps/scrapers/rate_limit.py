@@ -0,0 +1,115 @@
+import calendar
+import threading
+import time
+
+
+class TokenBucket:
+    """Thread-safe token bucket shared by every worker hitting the same API budget
+
+    Parameters
+    -------
+    calls: int
+        number of calls allowed per period (e.g. 5000 for the GitHub REST API)
+    period: float
+        length of the budget window in seconds
+    burst: int
+        maximum number of tokens that can be banked, by default `calls`
+    """
+
+    def __init__(self, calls: int, period: float, burst: int = None):
+        self.rate = calls / period
+        self.capacity = burst if burst is not None else calls
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def acquire(self, tokens: int = 1):
+        """Block until `tokens` are available, then consume them"""
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class RateLimitTracker:
+    """Keep a local view of the GitHub rate limit from response headers
+
+    The rate_limit endpoint is only queried on startup, or after a response came
+    back without `X-RateLimit-*` headers; every other decision to sleep is made
+    (by `TokenPool`) from the headers of responses we already received.
+
+    Parameters
+    -------
+    github: Github
+        PyGithub client used for the fallback rate_limit call
+    resource: str
+        rate limit bucket to track, responses for other resources are ignored
+    """
+
+    def __init__(self, github, resource: str = "core"):
+        self.github = github
+        self.resource = resource
+        self.remaining = None
+        self.reset_at = None
+        self.synced = False
+        self.rate_limit_calls = 0
+        self._lock = threading.Lock()
+
+    def update(self, headers):
+        """Record the limit from the headers of a `requests` response"""
+        if headers.get("X-RateLimit-Resource", self.resource) != self.resource:
+            return
+        remaining = headers.get("X-RateLimit-Remaining")
+        reset_at = headers.get("X-RateLimit-Reset")
+        with self._lock:
+            if remaining is None or reset_at is None:
+                self.synced = False
+                return
+            self.remaining = int(remaining)
+            self.reset_at = int(reset_at)
+            self.synced = True
+
+    def update_from_github(self, github=None):
+        """Record the limit PyGithub parsed from the last response it received"""
+        github = github or self.github
+        # PyGithub only calls the rate_limit endpoint itself if it has not seen
+        # any rate limit headers yet
+        remaining, _ = github.rate_limiting
+        reset_at = github.rate_limiting_resettime
+        with self._lock:
+            self.remaining = remaining
+            self.reset_at = reset_at
+            self.synced = True
+
+    def refresh(self):
+        """Query the rate_limit endpoint, which does not count against the limit"""
+        limit = getattr(self.github.get_rate_limit(), self.resource)
+        with self._lock:
+            self.rate_limit_calls += 1
+            self.remaining = limit.remaining
+            self.reset_at = calendar.timegm(limit.reset.utctimetuple())
+            self.synced = True
+
+    def reserve(self):
+        """Count one call against the known budget, forgetting it once the window reset"""
+        with self._lock:
+            if self.reset_at is not None and self.reset_at <= time.time():
+                self.remaining = None
+            if self.remaining is not None:
+                self.remaining -= 1
+
+    def stats(self):
+        return {
+            "remaining": self.remaining,
+            "reset_at": self.reset_at,
+            "rate_limit_calls": self.rate_limit_calls,
+        }
@@ -1,7 +1,9 @@
+import heapq
 import json
 import os
 from pathlib import Path
 import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import List
 
 import pandas as pd
@@ -14,10 +16,15 @@ from tqdm import tqdm
 import logging
 from pathlib import Path
 from dotenv import load_dotenv
-from datetime import datetime
-from github import Github
-from ratelimit import limits
+from datetime import datetime, timedelta, timezone
+from github import Github, GithubException, RateLimitExceededException
 import requests
+from requests.adapters import HTTPAdapter
+
+from .http_cache import HttpCache
+from .state import JsonStore
+from .token_pool import TokenPool
+from .weekly_stats import WEEKLY_STATS_COLUMNS, build_weekly_stats_frame
 
 # get the standard UTC time
 # g = Github(TOKEN)
@@ -31,6 +38,66 @@ repo_list_file = "data/merged_repos.csv"
 
 ONE_HOUR = 3600
 
+REPO_INFO_TO_SCRAPE = [
+    "created_at",
+    "updated_at",
+    "pushed_at",
+    "size",
+    "stargazers_count",
+    "watchers_count",
+    "language",
+    "has_issues",
+    "has_projects",
+    "has_downloads",
+    "has_wiki",
+    "has_pages",
+    "forks_count",
+]
+
+GRAPHQL_URL = "https://api.github.com/graphql"
+
+# Same fields as REPO_INFO_TO_SCRAPE.
+# GraphQL has no has_downloads/has_pages flags and watchers_count is an alias of
+# stargazers_count in the REST payload.
+GRAPHQL_REPO_FRAGMENT = """
+fragment repoFields on Repository {
+  createdAt
+  updatedAt
+  pushedAt
+  diskUsage
+  stargazerCount
+  primaryLanguage { name }
+  hasIssuesEnabled
+  hasProjectsEnabled
+  hasWikiEnabled
+  forkCount
+}
+"""
+# Seconds before retrying a failed GraphQL batch, doubled at every attempt
+GRAPHQL_RETRY_BACKOFF = 5
+# Errors the query is run again for, any other error on a repo's alias means the
+# repo can't be scraped (NOT_FOUND, FORBIDDEN...)
+TRANSIENT_GRAPHQL_ERRORS = ["RATE_LIMITED", "TIMEOUT"]
+
+
+class GraphqlError(Exception):
+    """A GraphQL batch failed as a whole, not because some repos can't be scraped"""
+
+
+class GraphqlRateLimited(GraphqlError):
+    """The GraphQL budget of a token ran out, or GitHub asked to slow down
+
+    Parameters
+    -------
+    wait: float
+        seconds to wait before querying again, 0 once the token is parked by the pool
+    """
+
+    def __init__(self, message: str, wait: float):
+        super().__init__(message)
+        self.wait = wait
+
+
 from IPython import get_ipython
 def isnotebook():
     try:
@@ -46,38 +113,72 @@ def isnotebook():
 
 class RepoScraper:
     """Scrape information of repos and the
-    contributors of those repositories"""
+    contributors of those repositories
+
+    Parameters
+    -------
+    max_workers: int
+        number of repos fetched concurrently, by default 1 (sequential).
+        Workers share one keep-alive connection pool and the token pool.
+    token_pool: TokenPool
+        credentials to spread the calls over, by default a pool holding only
+        `USERNAME`/`TOKEN`
+    http_cache: HttpCache
+        conditional-request cache to revalidate responses against, by default None
+    backend: str
+        "rest" (one request per repo) or "graphql" (`graphql_batch_size` repos per
+        request, contributors are still fetched through REST)
+    graphql_batch_size: int
+        number of aliased `repository` blocks per GraphQL request
+    graphql_retries: int
+        retries of a failed GraphQL batch before `GraphqlError` is raised
+    """
 
     def __init__(
-        self, repo_urls: list, max_n_top_contributors: int, USERNAME: str, TOKEN: str
+        self,
+        repo_urls: list,
+        max_n_top_contributors: int,
+        USERNAME: str = None,
+        TOKEN: str = None,
+        max_workers: int = 1,
+        token_pool: TokenPool = None,
+        http_cache: HttpCache = None,
+        backend: str = "rest",
+        graphql_batch_size: int = 50,
+        graphql_retries: int = 3,
     ):
         self.repo_urls = repo_urls
         self.max_n_top_contributors = max_n_top_contributors
         self.USERNAME = USERNAME
         self.TOKEN = TOKEN
-        self.github = Github(TOKEN)
+        self.token_pool = token_pool or TokenPool([(USERNAME, TOKEN)])
+        self.max_workers = max_workers
+        self.http_cache = http_cache
+        self.backend = backend
+        self.graphql_batch_size = graphql_batch_size
+        self.graphql_retries = graphql_retries
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(10, max_workers))
+        self.session.mount("https://", adapter)
 
-    @limits(calls=5000, period=ONE_HOUR)
     def call_api(self, url, *args):
-        response = requests.get(url, auth=(self.USERNAME, self.TOKEN))
+        credential = self.token_pool.acquire()
+        if self.http_cache is not None:
+            response = self.http_cache.get(url, self.session, auth=credential.auth)
+        else:
+            response = self.session.get(url, auth=credential.auth)
+        credential.rate_limit.update(response.headers)
         # if response.status_code == 404:
         #     return "Not Found"
         # if response.status_code != 200:
         #     raise Exception("API response: {}".format(response.status_code))
         return response
 
-    # This method is used to limit the rate of requests sent to GitHub
-
-    def __choke(self):
-        if self.github.get_rate_limit().core.remaining < 3:
-            naptime = (
-                self.github.get_rate_limit().core.reset - datetime.now()
-            ).seconds + 5
-            print(f"About to exceed rate limit :/ sleeping for {naptime} seconds")
-            time.sleep(naptime)
-            print("Done sleeping - back to work!")
-
     def get_all_top_repo_information(self):
+        if self.backend == "graphql":
+            return self._get_all_top_repo_information_graphql()
+        if self.max_workers > 1:
+            return self._get_all_top_repo_information_concurrently()
         top_repo_infos = []
 
         if isnotebook():
@@ -93,28 +194,215 @@ class RepoScraper:
         print(f"Finished getting repo info for {len(self.repo_urls)} repos!")
         return top_repo_infos
 
+    def _get_all_top_repo_information_concurrently(self):
+        """Fetch repo info over a bounded thread pool, results keep the order of `repo_urls`"""
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            results = executor.map(self._get_repo_information, self.repo_urls)
+            if isnotebook():
+                top_repo_infos = list(
+                    tqdm(
+                        results,
+                        total=len(self.repo_urls),
+                        desc="Scraping top GitHub repositories...",
+                    )
+                )
+            else:
+                top_repo_infos = list(
+                    track(
+                        results,
+                        total=len(self.repo_urls),
+                        description="Scraping top GitHub repositories...",
+                    )
+                )
+        print(f"Finished getting repo info for {len(self.repo_urls)} repos!")
+        return top_repo_infos
+
+    def _get_all_top_repo_information_graphql(self):
+        """Fetch repo info in GraphQL batches, then the contributors through REST"""
+        batches = [
+            self.repo_urls[i : i + self.graphql_batch_size]
+            for i in range(0, len(self.repo_urls), self.graphql_batch_size)
+        ]
+        top_repo_infos = []
+        if isnotebook():
+            for batch in tqdm(batches, desc="Scraping top GitHub repositories..."):
+                top_repo_infos.extend(self._get_repo_information_batch(batch))
+        else:
+            for batch in track(
+                batches, description="Scraping top GitHub repositories..."
+            ):
+                top_repo_infos.extend(self._get_repo_information_batch(batch))
+
+        valid_repo_infos = [
+            info for info in top_repo_infos if info["contributors"] != "Invalid Repo"
+        ]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            contributors = executor.map(
+                self._get_contributor_repo_of_one_repo,
+                [info["repo"] for info in valid_repo_infos],
+            )
+            for info, contributors_info in zip(valid_repo_infos, contributors):
+                info["contributors"] = contributors_info
+        print(f"Finished getting repo info for {len(self.repo_urls)} repos!")
+        return top_repo_infos
+
+    def _get_repo_information_batch(self, repo_urls: List[str]):
+        """Fetch the `_get_repo_information` fields of many repos in one GraphQL request
+
+        The returned dicts have the same shape as `_get_repo_information`, with
+        `contributors` left to None for the caller to fill in.
+        """
+        variables = {}
+        declarations = []
+        blocks = []
+        for i, repo_url in enumerate(repo_urls):
+            owner, _, name = repo_url.strip("/").partition("/")
+            variables[f"owner{i}"] = owner
+            variables[f"name{i}"] = name
+            declarations.append(f"$owner{i}: String!, $name{i}: String!")
+            blocks.append(
+                f"r{i}: repository(owner: $owner{i}, name: $name{i}) {{ ...repoFields }}"
+            )
+        query = (
+            f"query({', '.join(declarations)}) {{\n  "
+            + "\n  ".join(blocks)
+            + "\n}\n"
+            + GRAPHQL_REPO_FRAGMENT
+        )
+
+        data, invalid = self._post_graphql(
+            query, variables, [f"r{i}" for i in range(len(repo_urls))]
+        )
+
+        repo_infos = []
+        for i, repo_url in enumerate(repo_urls):
+            if f"r{i}" in invalid:
+                repo_infos.append(self._invalid_repo_information(repo_url))
+                continue
+            node = data[f"r{i}"]
+            repo_infos.append(
+                {
+                    "repo": repo_url,
+                    "created_at": node["createdAt"],
+                    "updated_at": node["updatedAt"],
+                    "pushed_at": node["pushedAt"],
+                    "size": node["diskUsage"],
+                    "stargazers_count": node["stargazerCount"],
+                    "watchers_count": node["stargazerCount"],
+                    "language": (node["primaryLanguage"] or {}).get("name"),
+                    "has_issues": node["hasIssuesEnabled"],
+                    "has_projects": node["hasProjectsEnabled"],
+                    "has_downloads": None,
+                    "has_wiki": node["hasWikiEnabled"],
+                    "has_pages": None,
+                    "forks_count": node["forkCount"],
+                    "contributors": None,
+                }
+            )
+        return repo_infos
+
+    @staticmethod
+    def _rate_limit_wait(headers):
+        """Seconds GitHub asks to wait, 0 when the token is out of points, None otherwise"""
+        if headers.get("Retry-After"):
+            return float(headers["Retry-After"])
+        if headers.get("X-RateLimit-Remaining") == "0":
+            # The token pool parks the token until `X-RateLimit-Reset`
+            return 0.0
+        return None
+
+    def _query_graphql(self, query: str, variables: dict):
+        """`data` and `errors` of one GraphQL request on the token with the most points left"""
+        credential = self.token_pool.acquire("graphql")
+        response = self.session.post(
+            GRAPHQL_URL,
+            json={"query": query, "variables": variables},
+            headers={"Authorization": f"bearer {credential.token}"},
+        )
+        credential.graphql_rate_limit.update(response.headers)
+        wait = self._rate_limit_wait(response.headers)
+        if response.status_code in (403, 429) and wait is not None:
+            raise GraphqlRateLimited(f"status code {response.status_code}", wait)
+        if response.status_code != 200:
+            raise GraphqlError(
+                f"status code {response.status_code}: {response.text[:200]}"
+            )
+        payload = response.json()
+        errors = payload.get("errors") or []
+        if errors:
+            print(f"GraphQL errors: {errors}")
+        types = {error.get("type") for error in errors}
+        if "RATE_LIMITED" in types:
+            raise GraphqlRateLimited(
+                "RATE_LIMITED", GRAPHQL_RETRY_BACKOFF if wait is None else wait
+            )
+        if types & set(TRANSIENT_GRAPHQL_ERRORS):
+            raise GraphqlError(f"{sorted(types & set(TRANSIENT_GRAPHQL_ERRORS))}")
+        return payload.get("data") or {}, errors
+
+    def _post_graphql(self, query: str, variables: dict, aliases: List[str]):
+        """Run a batched GraphQL query, retrying it when the whole batch failed
+
+        Failed requests, statuses other than 200 and `TRANSIENT_GRAPHQL_ERRORS`
+        are retried with a backoff. Rate limits don't use up the retries: the
+        query waits for `Retry-After`, or for another token, as the pool parks
+        the ones out of points until their reset.
+
+        Returns
+        -------
+        Tuple[dict, set]
+            `data` of the response and the aliases that came back null with an
+            error of their own (NOT_FOUND, FORBIDDEN...), repos that can't be scraped
+
+        Raises
+        -------
+        GraphqlError
+            when the batch still failed after `graphql_retries` retries, or an
+            alias came back null without any error
+        """
+        attempt = 0
+        while True:
+            try:
+                data, errors = self._query_graphql(query, variables)
+                break
+            except GraphqlRateLimited as e:
+                print(f"GraphQL rate limited ({e}), querying again in {e.wait:.0f}s")
+                time.sleep(e.wait)
+            except (requests.RequestException, ValueError, GraphqlError) as e:
+                print(f"GraphQL request for {len(aliases)} repos failed due to {e}")
+                if attempt == self.graphql_retries:
+                    raise GraphqlError(
+                        f"GraphQL request for {len(aliases)} repos failed after "
+                        f"{attempt + 1} attempts: {e}"
+                    ) from e
+                time.sleep(GRAPHQL_RETRY_BACKOFF * 2**attempt)
+                attempt += 1
+
+        invalid = {error["path"][0] for error in errors if error.get("path")}
+        invalid = {alias for alias in invalid if data.get(alias) is None}
+        missing = [
+            alias for alias in aliases if data.get(alias) is None and alias not in invalid
+        ]
+        if missing:
+            raise GraphqlError(
+                f"{len(missing)} of {len(aliases)} repos missing from the response"
+            )
+        return data, invalid
+
+    @staticmethod
+    def _invalid_repo_information(repo_url: str):
+        repo_important_info = {"repo": repo_url}
+        for info in REPO_INFO_TO_SCRAPE + ["contributors"]:
+            repo_important_info[info] = "Invalid Repo"
+        return repo_important_info
+
     def _get_repo_information(self, repo_url: str):
-        self.__choke()
         repo_info_url = f"https://api.github.com/repos{repo_url}"
         repo_important_info = {}
         try:
             repo_resp = self.call_api(repo_info_url)
             repo_info = repo_resp.json()
-            info_to_scrape = [
-                "created_at",
-                "updated_at",
-                "pushed_at",
-                "size",
-                "stargazers_count",
-                "watchers_count",
-                "language",
-                "has_issues",
-                "has_projects",
-                "has_downloads",
-                "has_wiki",
-                "has_pages",
-                "forks_count",
-            ]
+            info_to_scrape = REPO_INFO_TO_SCRAPE
 
             repo_important_info["repo"] = repo_url
             for info in info_to_scrape:
@@ -134,7 +422,6 @@ class RepoScraper:
             return repo_important_info
 
     def _get_contributor_repo_of_one_repo(self, repo_url: str):
-        self.__choke()
         contributor_url = f"https://api.github.com/repos{repo_url}/contributors"
         contributor_page_resp = self.call_api(contributor_url)
         contributor_page = contributor_page_resp.json()
@@ -173,261 +460,338 @@ class RepoScraper:
             return num_contributors
 
 
+class StatsNotReady(Exception):
+    """GitHub answered 202: the repo stats are being computed, ask again later"""
+
+
+# Failures worth asking again for, others (missing repo, bad credentials...) are final
+RETRYABLE_ERRORS = (StatsNotReady, RateLimitExceededException, requests.RequestException)
+
+
+def is_retryable(error: Exception):
+    if isinstance(error, RETRYABLE_ERRORS):
+        return True
+    return isinstance(error, GithubException) and error.status >= 500
+
+
 class RepoStatsScraper:
     """Scrape information of repos and the
     contributors of those repositories"""
 
-    def __init__(self, USERNAME: str, TOKEN: str, since: datetime = None):
+    def __init__(
+        self,
+        USERNAME: str = None,
+        TOKEN: str = None,
+        since: datetime = None,
+        token_pool: TokenPool = None,
+    ):
         self.USERNAME = USERNAME
         self.TOKEN = TOKEN
-        self.github = Github(TOKEN)
+        self.token_pool = token_pool or TokenPool([(USERNAME, TOKEN)])
         self.since = since
 
-    # This method is used to limit the rate of requests sent to GitHub
+    # This method is used to limit the rate of requests sent to GitHub, it returns
+    # the client of the token with the most remaining quota
     def __choke(self):
-        remaining = self.github.get_rate_limit().core.remaining
-        print(f"There are {remaining} remaining requests before ratelimiting")
-        if remaining < 3:
-            naptime = (
-                self.github.get_rate_limit().core.reset - datetime.now()
-            ).seconds + 5
-            print(f"About to exceed rate limit :/ sleeping for {naptime} seconds")
-            time.sleep(naptime)
-            print("Done sleeping - back to work!")
-
-    def _get_repo_weekly_stats(self, repo_url: str):
-        self.__choke()
+        credential = self.token_pool.acquire()
+        print(
+            f"There are {credential.rate_limit.remaining} remaining requests before ratelimiting"
+        )
+        return credential
+
+    def _fetch_repo_pages(self, repo_url: str, cutoffs: tuple = (None, None, None)):
+        """Raw stats pages of one repo, raising when the requests fail
+
+        Returns
+        -------
+        Tuple[str, tuple]
+            repo path without leading slash, (stargazer, commit activity,
+            code frequency) pages newer than `cutoffs`
+        """
+        credential = self.__choke()
+        if repo_url.startswith("/"):
+            repo_url = repo_url[1:]
         try:
-            if repo_url.startswith("/"):
-                repo_url = repo_url[1:]
-            repo = self.github.get_repo(repo_url, lazy=False)
-
-            starPages = [
-                (stargazer.user.login, stargazer.starred_at)
-                for stargazer in repo.get_stargazers_with_dates()
-            ]
-            # statsContributorsPages = repo.get_stats_contributors()
-            statsCommitActivityPages = [
-                week.raw_data for week in repo.get_stats_commit_activity()
-            ]
-            statsCodeFrequencyPages = [
-                week.raw_data for week in repo.get_stats_code_frequency()
-            ]
-
-            # Stars over time
-            if len(starPages) > 0:
-                stargazer_dates_df = pd.DataFrame(starPages).rename(
-                    columns={0: "stargazer", 1: "starred_at"}
-                )
-                stars_by_day = stargazer_dates_df.groupby(
-                    pd.Grouper(key="starred_at", freq="1W")
-                ).agg(
-                    {
-                        "stargazer": [list, "size"],
-                    }
-                )  # stargazer_dates_df.groupby(stargazer_dates_df.starred_at.dt.date).agg({'stargazer':[list, 'size'], })
-                stars_by_day.columns = [i + "_" + y for i, y in stars_by_day.columns]
-                stars_by_day.reset_index(inplace=True)
-                stars_by_day["starred_at"] = pd.to_datetime(stars_by_day.starred_at)
-            else:
-                stars_by_day = pd.DataFrame(
-                    columns=[
-                        "starred_at",
-                        "stargazer_list",
-                        "stargazer_size",
-                    ]
-                )
-
-            ### Commit Frequency
-            if len(statsCommitActivityPages) > 0:
-                statsCommitActivity_df = pd.DataFrame(statsCommitActivityPages).rename(
-                    columns={"total": "total_commits", "days": "commits_per_day"}
-                )
-                statsCommitActivity_df["week"] = pd.to_datetime(
-                    statsCommitActivity_df.week, unit="s"
-                )
-            else:
-                statsCommitActivity_df = pd.DataFrame(
-                    columns=[
-                        "week",
-                        "total_commits",
-                        "commits_per_day",
-                    ]
-                )
-
-            ### Code frequency
-            if len(statsCodeFrequencyPages) > 0:
-                statsCodeFrequencyPages_df = pd.DataFrame(statsCodeFrequencyPages)
-                statsCodeFrequencyPages_df.rename(
-                    columns={0: "week", 1: "additions", 2: "deletions"}, inplace=True
-                )
-                statsCodeFrequencyPages_df["week"] = pd.to_datetime(
-                    statsCodeFrequencyPages_df.week, unit="s"
-                )
-            else:
-                statsCodeFrequencyPages_df = pd.DataFrame(
-                    columns=["week", "additions", "deletions"]
-                )
-
-            # merge data
-            commits_add_delete_df = pd.merge(
-                statsCodeFrequencyPages_df,
-                statsCommitActivity_df,
-                left_on="week",
-                right_on="week",
-                how="outer",
-            )
-            commits_add_delete_and_stars_df = pd.merge(
-                stars_by_day,
-                commits_add_delete_df,
-                left_on="starred_at",
-                right_on="week",
-                how="outer",
-            )
-            commits_add_delete_and_stars_df["repo_path"] = repo_url
-            return commits_add_delete_and_stars_df
+            repo = credential.github.get_repo(repo_url, lazy=False)
+            return repo_url, self._get_new_pages(repo, *cutoffs)
+        finally:
+            # Pages fetched through PyGithub carry the rate limit headers, keep
+            # the pool's view of this token up to date
+            credential.rate_limit.update_from_github()
+
+    def _get_repo_pages(self, repo_url: str, cutoffs: tuple = (None, None, None)):
+        """`_fetch_repo_pages`, with None as pages if the requests failed"""
+        try:
+            return self._fetch_repo_pages(repo_url, cutoffs)
         except Exception as e:
             print(f"Request for {repo_url} failed due to {e}")
-            return pd.DataFrame(
-                columns=[
-                    "starred_at",
-                    "stargazer_list",
-                    "stargazer_size",
-                    "week",
-                    "additions",
-                    "deletions",
-                    "total_commits",
-                    "commits_per_day",
-                    "repo_path",
-                ]
-            )
+            return repo_url[1:] if repo_url.startswith("/") else repo_url, None
+
+    def _get_repo_weekly_stats(self, repo_url: str):
+        repo_url, pages = self._get_repo_pages(repo_url)
+        if pages is None:
+            return pd.DataFrame(columns=WEEKLY_STATS_COLUMNS)
+        return build_weekly_stats_frame({repo_url: pages})
 
     def _get_repo_weekly_stats_from_date(self, repo_url: str, from_datetime):
-        self.__choke()
         # from_datetime = datetime.strptime('2022-01-30', '%Y-%m-%d')
         # from_datetime = datetime.strptime(since, '%Y-%m-%d')
-        try:
-            if repo_url.startswith("/"):
-                repo_url = repo_url[1:]
-            repo = self.github.get_repo(repo_url, lazy=False)
+        repo_url, pages = self._get_repo_pages(
+            repo_url, (from_datetime, from_datetime, from_datetime)
+        )
+        if pages is None:
+            return pd.DataFrame(columns=WEEKLY_STATS_COLUMNS)
+        return build_weekly_stats_frame({repo_url: pages})
 
-            # Get reversed order
+    def get_all_repos_weekly_stats(self, repo_urls: List[str]):
+        """Weekly stats of many repos, built in a single pass once every repo is fetched"""
+        if isnotebook():
+            repo_urls = tqdm(repo_urls, desc="Scraping GitHub repo stats...")
+        else:
+            repo_urls = track(repo_urls, description="Scraping GitHub repo stats...")
+        pages_by_repo = {}
+        for repo_url in repo_urls:
+            repo_url, pages = self._get_repo_pages(repo_url)
+            if pages is not None:
+                pages_by_repo[repo_url] = pages
+        return build_weekly_stats_frame(pages_by_repo)
+
+    @staticmethod
+    def _get_new_pages(repo, star_cutoff, activity_cutoff, frequency_cutoff):
+        """Walk the stats of `repo` backwards, keeping what is newer than each cutoff
+
+        A cutoff of None keeps everything, stargazers are then listed forwards so
+        the extra request for the last page is skipped. Raises `StatsNotReady`
+        while GitHub is still computing the commit stats.
+        """
+        # Both asked first so GitHub computes them at once when neither is ready
+        commit_activity = repo.get_stats_commit_activity()
+        code_frequency = repo.get_stats_code_frequency()
+        if commit_activity is None or code_frequency is None:
+            raise StatsNotReady(f"stats of {repo.full_name} are being computed")
+
+        if star_cutoff is None:
+            starPages = [
+                (stargazer.user.login, stargazer.starred_at)
+                for stargazer in repo.get_stargazers_with_dates()
+            ]
+        else:
+            # Get reversed order, only get new info
             starPages = []
-            statsCommitActivityPages = []
-            statsCodeFrequencyPages = []
-            stargazersPaginated = repo.get_stargazers_with_dates().reversed
-            # commitActivityPaginated = reversed(repo.get_stats_commit_activity()[-1].weeks)
-            # codeFrequencyPaginated = reversed(repo.get_stats_code_frequency()[-1].weeks)
-            commitActivityPaginated = reversed(repo.get_stats_commit_activity())
-            codeFrequencyPaginated = reversed(repo.get_stats_code_frequency())
-
-            # Only get new info
-            for stargazer in stargazersPaginated:
-                if stargazer.starred_at > from_datetime:
+            for stargazer in repo.get_stargazers_with_dates().reversed:
+                if stargazer.starred_at > star_cutoff:
                     starPages.append((stargazer.user.login, stargazer.starred_at))
                 else:
                     break
 
-            for week in commitActivityPaginated:
-                if week.week > from_datetime:
-                    statsCommitActivityPages.append(week.raw_data)
-                else:
-                    break
-
-            for week in codeFrequencyPaginated:
-                if week.week > from_datetime:
-                    statsCodeFrequencyPages.append(week.raw_data)
-                else:
-                    break
-
-            # Stars over time
-            if len(starPages) > 0:
-                stargazer_dates_df = pd.DataFrame(starPages).rename(
-                    columns={0: "stargazer", 1: "starred_at"}
-                )
-                stars_by_day = stargazer_dates_df.groupby(
-                    pd.Grouper(key="starred_at", freq="1W")
-                ).agg(
-                    {
-                        "stargazer": [list, "size"],
-                    }
-                )  # stargazer_dates_df.groupby(stargazer_dates_df.starred_at.dt.date).agg({'stargazer':[list, 'size'], })
-                stars_by_day.columns = [i + "_" + y for i, y in stars_by_day.columns]
-                stars_by_day.reset_index(inplace=True)
-                stars_by_day["starred_at"] = pd.to_datetime(stars_by_day.starred_at)
+        # commitActivityPaginated = reversed(repo.get_stats_commit_activity()[-1].weeks)
+        # codeFrequencyPaginated = reversed(repo.get_stats_code_frequency()[-1].weeks)
+        statsCommitActivityPages = []
+        for week in reversed(commit_activity):
+            if activity_cutoff is None or week.week > activity_cutoff:
+                statsCommitActivityPages.append(week.raw_data)
             else:
-                stars_by_day = pd.DataFrame(
-                    columns=[
-                        "starred_at",
-                        "stargazer_list",
-                        "stargazer_size",
-                    ]
-                )
+                break
 
-            ### Commit Frequency
-            if len(statsCommitActivityPages) > 0:
-                statsCommitActivity_df = pd.DataFrame(statsCommitActivityPages).rename(
-                    columns={"total": "total_commits", "days": "commits_per_day"}
-                )
-                statsCommitActivity_df["week"] = pd.to_datetime(
-                    statsCommitActivity_df.week, unit="s"
-                )
+        statsCodeFrequencyPages = []
+        for week in reversed(code_frequency):
+            if frequency_cutoff is None or week.week > frequency_cutoff:
+                statsCodeFrequencyPages.append(week.raw_data)
             else:
-                statsCommitActivity_df = pd.DataFrame(
-                    columns=[
-                        "week",
-                        "total_commits",
-                        "commits_per_day",
-                    ]
-                )
+                break
 
-            ### Code frequency
-            if len(statsCodeFrequencyPages) > 0:
-                statsCodeFrequencyPages_df = pd.DataFrame(statsCodeFrequencyPages)
-                statsCodeFrequencyPages_df.rename(
-                    columns={0: "week", 1: "additions", 2: "deletions"}, inplace=True
-                )
-                statsCodeFrequencyPages_df["week"] = pd.to_datetime(
-                    statsCodeFrequencyPages_df.week, unit="s"
-                )
-            else:
-                statsCodeFrequencyPages_df = pd.DataFrame(
-                    columns=["week", "additions", "deletions"]
-                )
+        return starPages, statsCommitActivityPages, statsCodeFrequencyPages
 
-            # merge data
-            commits_add_delete_df = pd.merge(
-                statsCodeFrequencyPages_df,
-                statsCommitActivity_df,
-                left_on="week",
-                right_on="week",
-                how="outer",
-            )
-            commits_add_delete_and_stars_df = pd.merge(
-                stars_by_day,
-                commits_add_delete_df,
-                left_on="starred_at",
-                right_on="week",
-                how="outer",
-            )
-            commits_add_delete_and_stars_df["repo_path"] = repo_url
-            return commits_add_delete_and_stars_df
-        except Exception as e:
-            print(f"Request for {repo_url} failed due to {e}")
-            return pd.DataFrame(
-                columns=[
-                    "starred_at",
-                    "stargazer_list",
-                    "stargazer_size",
-                    "week",
-                    "additions",
-                    "deletions",
-                    "total_commits",
-                    "commits_per_day",
-                    "repo_path",
-                ]
+    @staticmethod
+    def _sync_cutoffs(marks: dict):
+        """Cutoffs re-fetching every source from the earliest week holding a high-water mark
+
+        Rows are keyed by week: a star week (Monday..Sunday) is labelled with the
+        Sunday the commit weeks start on. Every source is re-fetched from the
+        earliest label any of the marks falls in, so each returned row holds the
+        whole week of all three sources and can replace the stored one.
+        """
+        labels = []
+        starred_at = None
+        if marks.get("starred_at"):
+            starred_at = datetime.fromisoformat(marks["starred_at"])
+            star_tzinfo = starred_at.tzinfo
+            if star_tzinfo is not None:
+                starred_at = starred_at.astimezone(timezone.utc).replace(tzinfo=None)
+            # Sunday closing the week of the star, as in `_star_weeks`
+            labels.append(
+                datetime.combine(
+                    starred_at.date() + timedelta(days=6 - starred_at.weekday()),
+                    datetime.min.time(),
+                )
             )
+        for mark in ["commit_activity_week", "code_frequency_week"]:
+            if marks.get(mark):
+                labels.append(datetime.fromisoformat(marks[mark]))
+        if len(labels) == 0:
+            return None, None, None
+
+        # A source without a mark is fetched whole
+        first_label = min(labels)
+        star_cutoff = activity_cutoff = frequency_cutoff = None
+        if starred_at is not None:
+            # Stars of the first week start on the Monday before its label
+            star_cutoff = first_label - timedelta(days=6, seconds=1)
+            if star_tzinfo is not None:
+                star_cutoff = star_cutoff.replace(tzinfo=timezone.utc)
+        if marks.get("commit_activity_week"):
+            activity_cutoff = first_label - timedelta(seconds=1)
+        if marks.get("code_frequency_week"):
+            frequency_cutoff = first_label - timedelta(seconds=1)
+        return star_cutoff, activity_cutoff, frequency_cutoff
+
+    def sync_repo_weekly_stats(
+        self, repo_url: str, state: JsonStore, sink=None, full_refresh: bool = False
+    ):
+        """Fetch only the weekly stats newer than the high-water marks stored for a repo
+
+        `state` keeps, per repo, the latest `starred_at`, commit-activity week and
+        code-frequency week seen. The first sync of a repo (or `full_refresh`) fetches
+        everything. The returned rows cover whole weeks, so they replace the stored
+        rows for the same (repo_path, week).
+
+        Parameters
+        -------
+        sink: callable
+            called with the new rows before the high-water marks are moved, so a
+            crash while storing them does not lose data on the next sync
+        """
+        repo_path = repo_url[1:] if repo_url.startswith("/") else repo_url
+        marks = {} if full_refresh else state.get(repo_path, default={})
+        repo_path, pages = self._get_repo_pages(repo_path, self._sync_cutoffs(marks))
+        if pages is None:
+            return pd.DataFrame(columns=WEEKLY_STATS_COLUMNS)
+
+        new_rows = build_weekly_stats_frame({repo_path: pages})
+        if sink is not None:
+            sink(new_rows)
+        state.put(repo_path, self._advance_marks(marks, pages))
+        return new_rows
 
+    @staticmethod
+    def _advance_marks(marks: dict, pages: tuple):
+        """High-water marks moved to the newest star and weeks of `pages`"""
+        starPages, statsCommitActivityPages, statsCodeFrequencyPages = pages
+        marks = dict(marks)
+        if len(starPages) > 0:
+            marks["starred_at"] = max(
+                starred_at for _, starred_at in starPages
+            ).isoformat()
+        if len(statsCommitActivityPages) > 0:
+            marks["commit_activity_week"] = datetime.utcfromtimestamp(
+                max(week["week"] for week in statsCommitActivityPages)
+            ).isoformat()
+        if len(statsCodeFrequencyPages) > 0:
+            marks["code_frequency_week"] = datetime.utcfromtimestamp(
+                max(week[0] for week in statsCodeFrequencyPages)
+            ).isoformat()
+        return marks
+
+    def sync_all_repos_weekly_stats(
+        self, repo_urls: List[str], state: JsonStore, sink=None
+    ):
+        """`sync_repo_weekly_stats` for every repo, returning all the new rows"""
+        if isnotebook():
+            repo_urls = tqdm(repo_urls, desc="Syncing GitHub repo stats...")
+        else:
+            repo_urls = track(repo_urls, description="Syncing GitHub repo stats...")
+        new_rows = [
+            self.sync_repo_weekly_stats(repo_url, state, sink=sink)
+            for repo_url in repo_urls
+        ]
+        return pd.concat(new_rows, ignore_index=True)
+
+    def run_weekly_stats_job(
+        self,
+        repo_urls: List[str],
+        manifest: JsonStore,
+        sink,
+        state: JsonStore = None,
+        max_attempts: int = 6,
+        backoff: float = 2.0,
+        max_backoff: float = 300.0,
+    ):
+        """Resumable weekly stats run over many repos, checkpointed in `manifest`
+
+        Every repo ends up in `manifest` as "done", "failed" (final error or out
+        of attempts) or "retryable" while it waits for another attempt. Repos
+        already done are skipped, so a run killed partway is started again with
+        the same arguments. 202 "stats being computed" answers, rate limits and
+        network errors are retried after `backoff` seconds, doubled at every
+        attempt up to `max_backoff`, while the other repos go on.
+
+        Parameters
+        -------
+        manifest: JsonStore
+            per repo status, kept between runs
+        sink: callable
+            called with the rows of every repo before it is marked done, e.g. a
+            `SqliteStatsLoader`
+        state: JsonStore
+            high-water marks as in `sync_repo_weekly_stats`, only new weeks are
+            fetched when given
+
+        Returns
+        -------
+        dict
+            number of repos per status at the end of the run
+        """
+        repo_paths = list(
+            dict.fromkeys(url[1:] if url.startswith("/") else url for url in repo_urls)
+        )
+        statuses = manifest.items()
+        pending = [
+            repo_path
+            for repo_path in repo_paths
+            if statuses.get(repo_path, {}).get("status") != "done"
+        ]
+        print(f"{len(pending)} of {len(repo_paths)} repos left to scrape")
+        # (time of the next attempt, attempt number, repo_path)
+        retry_queue = []
+        counts = {"done": len(repo_paths) - len(pending), "failed": 0}
+        while pending or retry_queue:
+            if retry_queue and (not pending or retry_queue[0][0] <= time.time()):
+                next_at, attempt, repo_path = heapq.heappop(retry_queue)
+                time.sleep(max(0.0, next_at - time.time()))
+            else:
+                attempt, repo_path = 0, pending.pop(0)
+
+            marks = state.get(repo_path, default={}) if state is not None else {}
+            try:
+                _, pages = self._fetch_repo_pages(repo_path, self._sync_cutoffs(marks))
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+                if is_retryable(e) and attempt + 1 < max_attempts:
+                    delay = min(backoff * 2**attempt, max_backoff)
+                    print(f"{repo_path} not scraped ({error}), retrying in {delay:.0f}s")
+                    manifest.put(
+                        repo_path,
+                        {"status": "retryable", "attempts": attempt + 1, "error": error},
+                    )
+                    heapq.heappush(retry_queue, (time.time() + delay, attempt + 1, repo_path))
+                else:
+                    print(f"Request for {repo_path} failed due to {error}")
+                    manifest.put(
+                        repo_path,
+                        {"status": "failed", "attempts": attempt + 1, "error": error},
+                    )
+                    counts["failed"] += 1
+                continue
+
+            rows = build_weekly_stats_frame({repo_path: pages})
+            sink(rows)
+            if state is not None:
+                state.put(repo_path, self._advance_marks(marks, pages))
+            manifest.put(
+                repo_path, {"status": "done", "attempts": attempt + 1, "n_rows": len(rows)}
+            )
+            counts["done"] += 1
+        return counts
 
 from dataclasses import dataclass
 from bs4 import BeautifulSoup
@@ -534,10 +898,39 @@ class ScrapeGithubUrl:
 
 
 class UserProfileGetter:
-    """Get the information from users' homepage"""
+    """Get the information from users' homepage
+
+    Parameters
+    -------
+    urls: List[str]
+        API urls of the profiles (https://api.github.com/users/<login>)
+    max_workers: int
+        number of profiles fetched concurrently, by default 1 (sequential)
+    profile_cache: JsonStore
+        persistent cache of fetched profiles, by default None
+    cache_ttl: float
+        seconds a cached profile is served for before it is fetched again
+
+    Profiles that could not be fetched come back as rows with their `login`,
+    a `status` of "not_found" or "error" and the `error` message, so merging
+    on `login` keeps working.
+    """
 
-    def __init__(self, urls: List[str]) -> pd.DataFrame:
+    def __init__(
+        self,
+        urls: List[str],
+        token_pool: TokenPool = None,
+        http_cache: HttpCache = None,
+        max_workers: int = 1,
+        profile_cache: JsonStore = None,
+        cache_ttl: float = 24 * ONE_HOUR,
+    ) -> pd.DataFrame:
         self.urls = urls
+        self.token_pool = token_pool or TokenPool([(USERNAME, TOKEN)])
+        self.http_cache = http_cache
+        self.max_workers = max_workers
+        self.profile_cache = profile_cache
+        self.cache_ttl = cache_ttl
         self.profile_features = [
             "login",
             "url",
@@ -554,26 +947,75 @@ class UserProfileGetter:
             "following",
         ]
 
+    def _error_row(self, profile_url: str, status: str, error: str):
+        row = {key: None for key in self.profile_features}
+        row["login"] = profile_url.rstrip("/").rsplit("/", 1)[-1]
+        row["url"] = profile_url
+        row["status"] = status
+        row["error"] = error
+        return row
+
     def _get_one_user_profile(self, profile_url: str):
-        profile = requests.get(profile_url, auth=(USERNAME, TOKEN)).json()
-        return {
-            key: val for key, val in profile.items() if key in self.profile_features
-        }
+        if self.profile_cache is not None:
+            cached = self.profile_cache.get(profile_url, max_age=self.cache_ttl)
+            if cached is not None:
+                return cached
+        try:
+            credential = self.token_pool.acquire()
+            if self.http_cache is not None:
+                response = self.http_cache.get(profile_url, auth=credential.auth)
+            else:
+                response = requests.get(profile_url, auth=credential.auth)
+            credential.rate_limit.update(response.headers)
+        except requests.RequestException as e:
+            print(f"Request for {profile_url} failed due to {e}")
+            return self._error_row(profile_url, "error", str(e))
+
+        if response.status_code == 404:
+            row = self._error_row(profile_url, "not_found", "Not Found")
+        elif response.status_code != 200:
+            return self._error_row(
+                profile_url, "error", f"API response: {response.status_code}"
+            )
+        else:
+            profile = response.json()
+            row = {
+                key: val for key, val in profile.items() if key in self.profile_features
+            }
+            row["status"] = "ok"
+            row["error"] = None
+        if self.profile_cache is not None:
+            self.profile_cache.put(profile_url, row)
+        return row
 
     def get_all_user_profiles(self):
 
-        if isnotebook():
-            all_contributors = [
-                self._get_one_user_profile(url)
-                for url in tqdm(self.urls, desc="Scraping top GitHub profiles...")
-            ]
+        if self.max_workers > 1:
+            executor = ThreadPoolExecutor(max_workers=self.max_workers)
+            profiles = executor.map(self._get_one_user_profile, self.urls)
         else:
-            all_contributors = [
-                self._get_one_user_profile(url)
-                for url in track(
-                    self.urls, description="Scraping top GitHub profiles..."
+            executor = None
+            profiles = map(self._get_one_user_profile, self.urls)
+        try:
+            if isnotebook():
+                all_contributors = list(
+                    tqdm(
+                        profiles,
+                        total=len(self.urls),
+                        desc="Scraping top GitHub profiles...",
+                    )
                 )
-            ]
+            else:
+                all_contributors = list(
+                    track(
+                        profiles,
+                        total=len(self.urls),
+                        description="Scraping top GitHub profiles...",
+                    )
+                )
+        finally:
+            if executor is not None:
+                executor.shutdown()
         all_contributors_df = pd.DataFrame(all_contributors).reset_index(drop=True)
 
         return all_contributors_df
@@ -0,0 +1,72 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class JsonStore:
+    """Small persistent key -> JSON value store backed by sqlite
+
+    Used for the scrapers' local state: cached profiles, sync high-water marks
+    and job manifests. Every value remembers when it was last written so callers
+    can apply a TTL.
+
+    Parameters
+    -------
+    path: str
+        sqlite file holding the store, shared by several tables if needed
+    table: str
+        name of the table (namespace) inside the file
+    """
+
+    def __init__(self, path: str, table: str = "state"):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.table = table
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            f"""CREATE TABLE IF NOT EXISTS {table} (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )"""
+        )
+        self._conn.commit()
+
+    def get(self, key: str, max_age: float = None, default=None):
+        """Value stored under `key`, or `default` if missing or older than `max_age` seconds"""
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value, updated_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return default
+        value, updated_at = row
+        if max_age is not None and time.time() - updated_at > max_age:
+            return default
+        return json.loads(value)
+
+    def put(self, key: str, value):
+        self.put_many({key: value})
+
+    def put_many(self, items: dict):
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                f"REPLACE INTO {self.table} VALUES (?, ?, ?)",
+                [(key, json.dumps(value, default=str), now) for key, value in items.items()],
+            )
+            self._conn.commit()
+
+    def delete(self, key: str):
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def items(self):
+        with self._lock:
+            rows = self._conn.execute(f"SELECT key, value FROM {self.table}").fetchall()
+        return {key: json.loads(value) for key, value in rows}
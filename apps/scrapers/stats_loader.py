@@ -0,0 +1,236 @@
+import json
+import os
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+
+from .weekly_stats import WEEKLY_STATS_COLUMNS
+
+STATS_TABLE = "steady-voltage-236500.github_repo_commits.github_repo_stats_historyv2"
+LIST_COLUMNS = ["stargazer_list", "commits_per_day"]
+DATETIME_COLUMNS = ["starred_at", "week"]
+# Columns of the upserted table, in order
+TABLE_COLUMNS = [
+    "repo_path",
+    "week_key",
+    "starred_at",
+    "stargazer_list",
+    "stargazer_size",
+    "week",
+    "additions",
+    "deletions",
+    "total_commits",
+    "commits_per_day",
+]
+# Count column telling whether a row carries its list column, BigQuery can't
+# store a NULL array
+LIST_PRESENCE_COLUMNS = {"stargazer_list": "stargazer_size", "commits_per_day": "total_commits"}
+
+
+def _prepare_frame(frame: pd.DataFrame) -> pd.DataFrame:
+    """Weekly stats rows ready to upsert, one row per (repo_path, week)
+
+    Rows only holding stars have no `week`, their key falls back to `starred_at`
+    (both are the same weekly bin). Later rows win when a key is repeated.
+    """
+    frame = frame[WEEKLY_STATS_COLUMNS].copy()
+    frame["repo_path"] = frame["repo_path"].astype(str)
+    for column in DATETIME_COLUMNS:
+        frame[column] = pd.to_datetime(frame[column])
+    week_key = frame["week"].fillna(frame["starred_at"])
+    frame = frame[week_key.notna().to_numpy()]
+    week_key = week_key[week_key.notna()]
+    keep = ~pd.DataFrame(
+        {"repo_path": frame["repo_path"], "week_key": week_key}
+    ).duplicated(keep="last")
+    return frame[keep.to_numpy()].reset_index(drop=True)
+
+
+class SqliteStatsLoader:
+    """Local file-backed stand-in for the BigQuery stats table
+
+    Same upsert-by-(repo_path, week) semantics as `BigQueryStatsLoader`, so
+    scraping and loading can be exercised without GCP credentials. Columns an
+    incoming row has no value for keep their stored value. List columns are
+    stored as JSON and timestamps as ISO strings.
+
+    Parameters
+    -------
+    path: str
+        sqlite file holding the table
+    table: str
+        name of the table inside the file
+    batch_rows: int
+        number of rows written per transaction
+    """
+
+    def __init__(
+        self,
+        path: str = "./data/cache/github_repo_stats.sqlite",
+        table: str = "github_repo_stats_historyv2",
+        batch_rows: int = 50000,
+    ):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.table = table
+        self.batch_rows = batch_rows
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            f"""CREATE TABLE IF NOT EXISTS {table} (
+                repo_path TEXT NOT NULL,
+                week_key TEXT NOT NULL,
+                starred_at TEXT,
+                stargazer_list TEXT,
+                stargazer_size INTEGER,
+                week TEXT,
+                additions INTEGER,
+                deletions INTEGER,
+                total_commits INTEGER,
+                commits_per_day TEXT,
+                PRIMARY KEY (repo_path, week_key)
+            )"""
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def _rows(frame: pd.DataFrame):
+        columns = {}
+        for column in DATETIME_COLUMNS:
+            values = frame[column].dt.strftime("%Y-%m-%dT%H:%M:%S")
+            columns[column] = values.astype(object).where(values.notna(), None)
+        columns["week_key"] = np.where(
+            columns["week"].notna(), columns["week"], columns["starred_at"]
+        )
+        for column in LIST_COLUMNS:
+            columns[column] = [
+                json.dumps(value) if isinstance(value, list) else None
+                for value in frame[column]
+            ]
+        for column in ["stargazer_size", "additions", "deletions", "total_commits"]:
+            values = frame[column].astype("Float64")
+            columns[column] = [
+                None if pd.isna(value) else int(value) for value in values
+            ]
+        return zip(
+            frame["repo_path"],
+            columns["week_key"],
+            columns["starred_at"],
+            columns["stargazer_list"],
+            columns["stargazer_size"],
+            columns["week"],
+            columns["additions"],
+            columns["deletions"],
+            columns["total_commits"],
+            columns["commits_per_day"],
+        )
+
+    def load(self, frame: pd.DataFrame) -> int:
+        """Upsert the rows of a `RepoStatsScraper` frame, returns the number of rows written"""
+        frame = _prepare_frame(frame)
+        updates = ", ".join(
+            f"{column} = COALESCE(excluded.{column}, {column})"
+            for column in TABLE_COLUMNS[2:]
+        )
+        upsert = (
+            f"INSERT INTO {self.table} VALUES ({', '.join('?' * len(TABLE_COLUMNS))}) "
+            f"ON CONFLICT (repo_path, week_key) DO UPDATE SET {updates}"
+        )
+        with self._lock:
+            for start in range(0, len(frame), self.batch_rows):
+                batch = frame.iloc[start : start + self.batch_rows]
+                self._conn.executemany(upsert, self._rows(batch))
+                self._conn.commit()
+        return len(frame)
+
+    # Usable as the `sink` of `RepoStatsScraper.sync_repo_weekly_stats`
+    __call__ = load
+
+    def read(self, repo_paths=None) -> pd.DataFrame:
+        """Rows of the table, optionally only for `repo_paths`, in the scraper's format"""
+        query = f"SELECT {', '.join(WEEKLY_STATS_COLUMNS)} FROM {self.table}"
+        params = []
+        if repo_paths is not None:
+            repo_paths = list(repo_paths)
+            query += f" WHERE repo_path IN ({', '.join('?' * len(repo_paths))})"
+            params = repo_paths
+        with self._lock:
+            frame = pd.read_sql_query(query, self._conn, params=params)
+        for column in DATETIME_COLUMNS:
+            frame[column] = pd.to_datetime(frame[column])
+        for column in LIST_COLUMNS:
+            frame[column] = [
+                json.loads(value) if isinstance(value, str) else np.nan
+                for value in frame[column]
+            ]
+        return frame
+
+
+class BigQueryStatsLoader:
+    """Upsert `RepoStatsScraper` frames into the BigQuery stats table
+
+    Each load stages the rows in a table next to the target through a single
+    Parquet load job, then folds them in with one MERGE on (repo_path, week),
+    instead of streaming rows one by one. Columns an incoming row has no value
+    for keep their stored value.
+
+    Parameters
+    -------
+    client: bigquery.Client
+        authenticated client, e.g. `apps.utils.client`
+    table: str
+        fully qualified target table
+    staging_table: str
+        table the batches are loaded into before the MERGE, `<table>_staging` by default
+    """
+
+    def __init__(self, client, table: str = STATS_TABLE, staging_table: str = None):
+        self.client = client
+        self.table = table
+        self.staging_table = staging_table or f"{table}_staging"
+
+    def load(self, frame: pd.DataFrame) -> int:
+        """Upsert the rows of a `RepoStatsScraper` frame, returns the number of rows written"""
+        from google.cloud import bigquery
+
+        frame = _prepare_frame(frame)
+        if len(frame) == 0:
+            return 0
+        job_config = bigquery.LoadJobConfig(
+            # Stage with the target's schema so the MERGE types line up
+            schema=self.client.get_table(self.table).schema,
+            source_format=bigquery.SourceFormat.PARQUET,
+            write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE,
+        )
+        parquet_options = bigquery.format_options.ParquetOptions()
+        parquet_options.enable_list_inference = True
+        job_config.parquet_options = parquet_options
+        self.client.load_table_from_dataframe(
+            frame, self.staging_table, job_config=job_config
+        ).result()
+
+        updates = ", ".join(
+            f"{column} = IF(S.{LIST_PRESENCE_COLUMNS[column]} IS NULL, T.{column}, S.{column})"
+            if column in LIST_PRESENCE_COLUMNS
+            else f"{column} = COALESCE(S.{column}, T.{column})"
+            for column in WEEKLY_STATS_COLUMNS
+        )
+        merge = f"""
+            MERGE `{self.table}` T
+            USING `{self.staging_table}` S
+            ON T.repo_path = S.repo_path
+                AND COALESCE(T.week, T.starred_at) = COALESCE(S.week, S.starred_at)
+            WHEN MATCHED THEN UPDATE SET {updates}
+            WHEN NOT MATCHED THEN INSERT ROW
+        """
+        try:
+            self.client.query(merge).result()
+        finally:
+            self.client.delete_table(self.staging_table, not_found_ok=True)
+        return len(frame)
+
+    # Usable as the `sink` of `RepoStatsScraper.sync_repo_weekly_stats`
+    __call__ = load
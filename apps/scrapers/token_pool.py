@@ -0,0 +1,184 @@
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import List, Tuple
+
+from github import Github
+from rich import print
+
+from .rate_limit import RateLimitTracker, TokenBucket
+
+ONE_HOUR = 3600
+
+
+@dataclass
+class GithubCredential:
+    """One GitHub account/token and its own view of the rate limits
+
+    `rate_limit` tracks the REST `core` budget, `graphql_rate_limit` the
+    separate point budget of the GraphQL API.
+    """
+
+    username: str
+    token: str
+    github: Github
+    rate_limit: RateLimitTracker
+    graphql_rate_limit: RateLimitTracker
+
+    @property
+    def auth(self):
+        return (self.username, self.token)
+
+    def tracker(self, resource: str = "core") -> RateLimitTracker:
+        return self.graphql_rate_limit if resource == "graphql" else self.rate_limit
+
+
+class TokenPool:
+    """Spread GitHub API calls over several tokens
+
+    Every call goes to the token with the most remaining quota. Tokens that are
+    about to run out are parked until their reset time, and only when every token
+    is parked does `acquire` sleep, so throughput grows with the number of tokens.
+
+    Parameters
+    -------
+    credentials: List[Tuple[str, str]]
+        (username, token) pairs
+    min_remaining: int
+        park a token once fewer requests than this are left on it
+    calls_per_hour: int
+        budget of a single token, the pool's token bucket allows this many calls
+        per hour for every token it holds
+    """
+
+    def __init__(
+        self,
+        credentials: List[Tuple[str, str]],
+        min_remaining: int = 3,
+        calls_per_hour: int = 5000,
+    ):
+        if len(credentials) == 0:
+            raise ValueError("TokenPool needs at least one (username, token) pair")
+        self.credentials = []
+        for username, token in credentials:
+            github = Github(token)
+            self.credentials.append(
+                GithubCredential(
+                    username=username,
+                    token=token,
+                    github=github,
+                    rate_limit=RateLimitTracker(github),
+                    graphql_rate_limit=RateLimitTracker(github, resource="graphql"),
+                )
+            )
+        self.min_remaining = min_remaining
+        # Shared by every scraper (and all of its worker threads) using the pool
+        self.bucket = TokenBucket(
+            calls=calls_per_hour * len(self.credentials), period=ONE_HOUR
+        )
+        self.sleep_count = 0
+        self.sleep_seconds = 0.0
+        self._lock = threading.Lock()
+        # (token, resource) pairs whose rate_limit call is in flight, so it's made only once
+        self._refreshing = set()
+
+    @classmethod
+    def from_env(
+        cls,
+        tokens_var: str = "GITHUB_TOKENS_LIVE",
+        username_var: str = "GITHUB_USERNAME_LIVE",
+        token_var: str = "GITHUB_TOKEN_LIVE",
+    ):
+        """Build a pool from a comma separated list of `token` or `username:token`
+
+        Falls back to the single `GITHUB_USERNAME_LIVE`/`GITHUB_TOKEN_LIVE` pair
+        when `GITHUB_TOKENS_LIVE` is not set.
+        """
+        default_username = os.getenv(username_var)
+        credentials = []
+        for entry in os.getenv(tokens_var, "").split(","):
+            entry = entry.strip()
+            if not entry:
+                continue
+            username, _, token = entry.rpartition(":")
+            credentials.append((username or default_username, token))
+        if len(credentials) == 0:
+            credentials.append((default_username, os.getenv(token_var)))
+        return cls(credentials)
+
+    def _headroom(self, credential: GithubCredential, now: float, resource: str = "core"):
+        """Calls left on a token, inf when unknown or the window has reset"""
+        rate_limit = credential.tracker(resource)
+        if rate_limit.remaining is None or rate_limit.reset_at <= now:
+            return float("inf")
+        return rate_limit.remaining
+
+    def _refresh(self, credentials: List[GithubCredential], resource: str):
+        try:
+            for credential in credentials:
+                credential.tracker(resource).refresh()
+        finally:
+            with self._lock:
+                self._refreshing.difference_update(
+                    (c.token, resource) for c in credentials
+                )
+
+    def acquire(self, resource: str = "core") -> GithubCredential:
+        """Reserve one call on the token with the most remaining quota
+
+        Parameters
+        -------
+        resource: str
+            "core" for REST calls, "graphql" for GraphQL queries, which are
+            metered on their own budget and not throttled by `bucket`
+        """
+        if resource == "core":
+            self.bucket.acquire()
+        while True:
+            with self._lock:
+                stale = [
+                    c
+                    for c in self.credentials
+                    if not c.tracker(resource).synced
+                    and (c.token, resource) not in self._refreshing
+                ]
+                self._refreshing.update((c.token, resource) for c in stale)
+            # The rate_limit calls are made without the lock, so the other
+            # workers keep acquiring tokens meanwhile
+            if stale:
+                self._refresh(stale, resource)
+                continue
+            with self._lock:
+                now = time.time()
+                credential = max(
+                    self.credentials, key=lambda c: self._headroom(c, now, resource)
+                )
+                headroom = self._headroom(credential, now, resource)
+                if headroom >= self.min_remaining:
+                    credential.tracker(resource).reserve()
+                    return credential
+                naptime = (
+                    min(c.tracker(resource).reset_at for c in self.credentials) - now + 5
+                )
+            print(
+                f"All {len(self.credentials)} tokens are about to exceed the rate limit :/ sleeping for {naptime:.0f} seconds"
+            )
+            time.sleep(naptime)
+            print("Done sleeping - back to work!")
+            with self._lock:
+                self.sleep_count += 1
+                self.sleep_seconds += naptime
+
+    def stats(self):
+        return {
+            "tokens": len(self.credentials),
+            "remaining": [c.rate_limit.remaining for c in self.credentials],
+            "graphql_remaining": [c.graphql_rate_limit.remaining for c in self.credentials],
+            "rate_limit_calls": sum(
+                c.rate_limit.rate_limit_calls + c.graphql_rate_limit.rate_limit_calls
+                for c in self.credentials
+            ),
+            "sleep_count": self.sleep_count,
+            "sleep_seconds": self.sleep_seconds,
+        }
@@ -0,0 +1,172 @@
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+WEEKLY_STATS_COLUMNS = [
+    "starred_at",
+    "stargazer_list",
+    "stargazer_size",
+    "week",
+    "additions",
+    "deletions",
+    "total_commits",
+    "commits_per_day",
+    "repo_path",
+]
+
+SECONDS_PER_DAY = 86400
+# 1970-01-01 was a Thursday
+EPOCH_WEEKDAY = 3
+
+
+def _star_weeks(starred_at: np.ndarray) -> np.ndarray:
+    """Epoch seconds of the Sunday closing the (Monday..Sunday) week of each star
+
+    Same bins and labels as `groupby(pd.Grouper(key="starred_at", freq="1W"))`.
+    """
+    days = starred_at.astype("datetime64[s]").astype(np.int64) // SECONDS_PER_DAY
+    weekday = (days + EPOCH_WEEKDAY) % 7
+    return (days + 6 - weekday) * SECONDS_PER_DAY
+
+
+def _group_stars(repo_codes: np.ndarray, logins: np.ndarray, weeks: np.ndarray):
+    """Weekly stargazer lists and counts per repo, with empty weeks filled in"""
+    order = np.lexsort((weeks, repo_codes))
+    repo_codes, logins, weeks = repo_codes[order], logins[order], weeks[order]
+    is_first = np.ones(len(weeks), dtype=bool)
+    is_first[1:] = (repo_codes[1:] != repo_codes[:-1]) | (weeks[1:] != weeks[:-1])
+    starts = np.flatnonzero(is_first)
+    group_repo = repo_codes[starts]
+    group_week = weeks[starts]
+    group_size = np.diff(np.append(starts, len(weeks)))
+    group_list = np.split(logins, starts[1:])
+
+    # Every week between a repo's first and last star, like pd.Grouper does
+    repo_change = np.ones(len(starts), dtype=bool)
+    repo_change[1:] = group_repo[1:] != group_repo[:-1]
+    repo_first = np.flatnonzero(repo_change)
+    repo_last = np.append(repo_first[1:], len(starts)) - 1
+    n_weeks = (group_week[repo_last] - group_week[repo_first]) // (7 * SECONDS_PER_DAY) + 1
+    offsets = np.arange(n_weeks.sum()) - np.repeat(np.cumsum(n_weeks) - n_weeks, n_weeks)
+    full_repo = np.repeat(group_repo[repo_first], n_weeks)
+    full_week = np.repeat(group_week[repo_first], n_weeks) + offsets * 7 * SECONDS_PER_DAY
+
+    # Groups are sorted the same way as the full index, so they can be placed by search
+    full_key = full_repo * (2**40) + full_week
+    position = np.searchsorted(full_key, group_repo * (2**40) + group_week)
+    full_size = np.zeros(len(full_week), dtype=np.int64)
+    full_size[position] = group_size
+    full_list = np.empty(len(full_week), dtype=object)
+    full_list[:] = [[] for _ in range(len(full_week))]
+    for i, stargazers in zip(position, group_list):
+        full_list[i] = stargazers.tolist()
+
+    return pd.DataFrame(
+        {
+            "repo_code": full_repo,
+            "starred_at": full_week,
+            "stargazer_list": full_list,
+            "stargazer_size": full_size,
+        }
+    )
+
+
+def build_weekly_stats_frame(
+    pages_by_repo: Dict[str, Tuple[List[tuple], List[dict], List[list]]]
+) -> pd.DataFrame:
+    """Build the weekly stats frame of many repos in one vectorized pass
+
+    Parameters
+    -------
+    pages_by_repo: dict
+        repo_path -> (stargazer pages as (login, starred_at) tuples,
+        commit activity `raw_data` dicts, code frequency `raw_data` lists)
+
+    Returns
+    -------
+    pd.DataFrame
+        `WEEKLY_STATS_COLUMNS`, one row per (repo_path, week) with a categorical
+        `repo_path`, matching what the per-repo pandas merges used to produce
+    """
+    repo_paths = list(pages_by_repo)
+    pages = list(pages_by_repo.values())
+
+    # Stars
+    star_counts = [len(star_pages) for star_pages, _, _ in pages]
+    star_total = sum(star_counts)
+    if star_total > 0:
+        logins = np.empty(star_total, dtype=object)
+        logins[:] = [login for star_pages, _, _ in pages for login, _ in star_pages]
+        starred_at = pd.to_datetime(
+            [starred for star_pages, _, _ in pages for _, starred in star_pages],
+            utc=True,
+        )
+        stars_df = _group_stars(
+            np.repeat(np.arange(len(repo_paths)), star_counts),
+            logins,
+            _star_weeks(starred_at.tz_localize(None).values),
+        )
+    else:
+        stars_df = pd.DataFrame(
+            {
+                "repo_code": pd.Series(dtype=np.int64),
+                "starred_at": pd.Series(dtype=np.int64),
+                "stargazer_list": pd.Series(dtype=object),
+                "stargazer_size": pd.Series(dtype=np.int64),
+            }
+        )
+
+    # Commit activity
+    activity_counts = [len(activity) for _, activity, _ in pages]
+    activity_pages = [week for _, activity, _ in pages for week in activity]
+    commits_per_day = np.empty(len(activity_pages), dtype=object)
+    commits_per_day[:] = [week["days"] for week in activity_pages]
+    activity_df = pd.DataFrame(
+        {
+            "repo_code": np.repeat(np.arange(len(repo_paths)), activity_counts),
+            "week": np.fromiter(
+                (week["week"] for week in activity_pages),
+                dtype=np.int64,
+                count=len(activity_pages),
+            ),
+            "total_commits": np.fromiter(
+                (week["total"] for week in activity_pages),
+                dtype=np.int64,
+                count=len(activity_pages),
+            ),
+            "commits_per_day": commits_per_day,
+        }
+    )
+
+    # Code frequency
+    frequency_counts = [len(frequency) for _, _, frequency in pages]
+    frequency = np.array(
+        [week for _, _, frequency_pages in pages for week in frequency_pages],
+        dtype=np.int64,
+    ).reshape(-1, 3)
+    frequency_df = pd.DataFrame(
+        {
+            "repo_code": np.repeat(np.arange(len(repo_paths)), frequency_counts),
+            "week": frequency[:, 0],
+            "additions": frequency[:, 1],
+            "deletions": frequency[:, 2],
+        }
+    )
+
+    commits_df = pd.merge(
+        frequency_df, activity_df, on=["repo_code", "week"], how="outer"
+    )
+    weekly_df = pd.merge(
+        stars_df,
+        commits_df,
+        left_on=["repo_code", "starred_at"],
+        right_on=["repo_code", "week"],
+        how="outer",
+    )
+    weekly_df["starred_at"] = pd.to_datetime(weekly_df["starred_at"], unit="s")
+    weekly_df["week"] = pd.to_datetime(weekly_df["week"], unit="s")
+    weekly_df["repo_path"] = pd.Categorical.from_codes(
+        weekly_df["repo_code"].astype(np.int64), categories=repo_paths
+    )
+    return weekly_df[WEEKLY_STATS_COLUMNS]
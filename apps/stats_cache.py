@@ -0,0 +1,133 @@
+import os
+import threading
+import time
+from typing import Callable, List
+
+import pandas as pd
+
+
+class RepoStatsCache:
+    """Local per-repo Parquet cache of the weekly stats table
+
+    Every repo_path is cached in its own file, so coins sharing repos, or the
+    same coin asked with its repos in another order, reuse what was already
+    fetched. Only the repo paths missing or older than `max_age` go to the
+    warehouse. Repos without any row are cached too, as empty files.
+
+    Parameters
+    -------
+    path: str
+        directory holding one Parquet file per repo_path
+    max_age: float
+        seconds after which a cached repo is fetched again
+    max_bytes: int
+        size bound of the directory, least recently read repos are evicted
+        once it is exceeded
+    """
+
+    def __init__(
+        self,
+        path: str = "./data/cache/repo_stats",
+        max_age: float = 12 * 3600,
+        max_bytes: int = 512 * 2**20,
+    ):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _file(self, repo_path: str):
+        return os.path.join(self.path, repo_path.replace("/", "__") + ".parquet")
+
+    def _read(self, repo_path: str, now: float):
+        """Cached rows of a repo, None when missing or stale"""
+        file = self._file(repo_path)
+        try:
+            modified_at = os.path.getmtime(file)
+            if now - modified_at > self.max_age:
+                return None
+            frame = pd.read_parquet(file)
+            # atime tracks the last read for eviction, mtime stays the fetch time
+            os.utime(file, (now, modified_at))
+            return frame
+        except (OSError, ValueError):
+            # Missing, evicted by another session meanwhile or unreadable
+            return None
+
+    def _write(self, repo_path: str, frame: pd.DataFrame):
+        file = self._file(repo_path)
+        tmp_file = f"{file}.{threading.get_ident()}.tmp"
+        frame.reset_index(drop=True).to_parquet(tmp_file, index=False)
+        os.replace(tmp_file, file)
+
+    def get(
+        self, repo_paths: List[str], fetch: Callable[[List[str]], pd.DataFrame]
+    ) -> pd.DataFrame:
+        """Stats rows of `repo_paths`, calling `fetch` once for the ones not cached
+
+        Parameters
+        -------
+        repo_paths: List[str]
+            'owner/name' paths, without quotes
+        fetch: callable
+            takes the list of missing repo paths and returns their rows, with a
+            `repo_path` column
+        """
+        repo_paths = list(dict.fromkeys(repo_paths))
+        now = time.time()
+        frames = {repo_path: self._read(repo_path, now) for repo_path in repo_paths}
+        missing = [repo_path for repo_path, frame in frames.items() if frame is None]
+        with self._lock:
+            self.hits += len(repo_paths) - len(missing)
+            self.misses += len(missing)
+
+        if len(missing) > 0:
+            fetched = fetch(sorted(missing))
+            by_repo = dict(tuple(fetched.groupby("repo_path", sort=False, observed=True)))
+            for repo_path in missing:
+                frame = by_repo.get(repo_path, fetched.iloc[:0])
+                self._write(repo_path, frame)
+                frames[repo_path] = frame
+            self._evict()
+
+        result = [frames[repo_path] for repo_path in repo_paths]
+        return pd.concat(result, ignore_index=True) if len(result) > 0 else pd.DataFrame()
+
+    def _evict(self):
+        """Drop stale files, then least recently read ones until `max_bytes` fits"""
+        now = time.time()
+        entries = []
+        with os.scandir(self.path) as files:
+            for entry in files:
+                if not entry.name.endswith(".parquet"):
+                    continue
+                stat = entry.stat()
+                if now - stat.st_mtime > self.max_age:
+                    self._remove(entry.path)
+                else:
+                    entries.append((stat.st_atime, stat.st_size, entry.path))
+        size = sum(entry_size for _, entry_size, _ in entries)
+        for _, entry_size, file in sorted(entries):
+            if size <= self.max_bytes:
+                break
+            self._remove(file)
+            size -= entry_size
+
+    @staticmethod
+    def _remove(file: str):
+        try:
+            os.remove(file)
+        except FileNotFoundError:
+            pass
+
+    def stats(self):
+        files = [entry for entry in os.scandir(self.path) if entry.name.endswith(".parquet")]
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "repos": len(files),
+            "bytes": sum(entry.stat().st_size for entry in files),
+        }
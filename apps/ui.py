@@ -5,6 +5,11 @@ import streamlit as st
 from pandas.tseries import offsets
 from urllib.parse import urlparse
 from . import utils
+from .coin_stats import (
+    add_cumulative_totals,
+    repo_totals,
+    stargazers_by_repo,
+)
 import streamlit.components.v1 as components
 
 
@@ -171,26 +176,26 @@ def make_clickable(val):
     return f'<a target="_blank" href="{val}">{val}</a>'
 
 
-def get_repo_stats_aggregates(coin_choice, data):
+def get_coin_repo_links(coin_choice, data):
+    """GitHub links of a coin's repos (without .git) keyed by their 'owner/name' path"""
     repo_link_choice = data.loc[
         data.name == coin_choice, "github_repos_complete"
     ].values[0]
     import re
 
-    pd.set_option("display.max_colwidth", -1)
-
     repo_link_choice = [re.sub("\.git", "", i) for i in repo_link_choice]
-    repo_paths = [f"'{str(urlparse(path).path)[1:]}'" for path in repo_link_choice]
-    repo_paths_dict = {
-        f"{str(urlparse(path).path)[1:]}": path for path in repo_link_choice
-    }
-    df = utils.get_coin_multiple_repos_stats(repo_paths)
+    return {f"{str(urlparse(path).path)[1:]}": path for path in repo_link_choice}
 
-    df_agg = df.groupby(by=["repo_path"]).sum()
+
+def get_repo_stats_aggregates(coin_choice, data, repo_totals_df):
+    pd.set_option("display.max_colwidth", -1)
+
+    repo_paths_dict = get_coin_repo_links(coin_choice, data)
+    # Already summed per repo and sorted, see coin_stats.repo_totals
+    df_agg = repo_totals_df.set_index("repo_path")
 
     df_agg = df_agg.apply(lambda x: pd.to_numeric(x, downcast="integer"))
 
-    df_agg.sort_values(by="stargazer_size", ascending=False, inplace=True)
     df_agg["url"] = df_agg.index.map(repo_paths_dict)
     df_agg.reset_index(inplace=True)
     # st.write(df_agg.index)
@@ -260,17 +265,36 @@ def get_repo_stats_history(coin_choice, data):
     #     if isinstance(links_dict["github"], list)
     #     else list(links_dict["github"])
     # )
-    repo_link_choice = data.loc[
-        data.name == coin_choice, "github_repos_complete"
-    ].values[0]
-    import re
-
-    repo_link_choice = [re.sub("\.git", "", i) for i in repo_link_choice]
-    repo_paths = [f"'{str(urlparse(path).path)[1:]}'" for path in repo_link_choice]
-    df = utils.get_coin_multiple_repos_stats(repo_paths[:100])
+    repo_paths = list(get_coin_repo_links(coin_choice, data))
+    df = utils.get_coin_multiple_repos_stats(repo_paths)
     return df
 
 
+def get_repo_weekly_totals(coin_choice, data, start=None, end=None):
+    """Stats of all the coin's repos summed per week, aggregated in the warehouse"""
+    repo_paths = list(get_coin_repo_links(coin_choice, data))
+    return utils.get_coin_weekly_totals(repo_paths, start, end)
+
+
+def get_coin_stats(coin_choice, coin_id, data):
+    """Aggregates read by the Home page charts, see apps/coin_stats.py
+
+    Served from the materialized files when the job has written them for this
+    coin, computed from the stats table otherwise.
+    """
+    coin_stats = utils.load_materialized_coin_stats(coin_id)
+    if coin_stats is None:
+        stats_df = get_repo_stats_history(coin_choice, data)
+        coin_stats = {
+            "weekly": add_cumulative_totals(
+                get_repo_weekly_totals(coin_choice, data)
+            ),
+            "repos": repo_totals(stats_df),
+            "stargazers": stargazers_by_repo(stats_df),
+        }
+    return coin_stats
+
+
 def get_social_links_html(coin_choice, df):
     """Produces HTML for UI: Social media links from coingecko df"""
     HtmlFile = open("./components/social_links.html", "r", encoding="utf-8")
@@ -291,11 +315,11 @@ def get_donate_button():
 
 
 ######## GITHUB
-def get_git_bar(data, container):
+def get_git_bar(data, container, aggregates):
 
     with container:
-        st.write(plot_cum_commits(data))
-        contributors = data["author"].unique().tolist()
+        st.write(plot_cum_commits(aggregates))
+        contributors = list(aggregates.authors)
         contributors.insert(0, None)  # Manually add default
 
         # Filters
@@ -347,13 +371,9 @@ def plot_top_contributors(data):
     return bars + text
 
 
-def plot_daily_contributions(data):
+def plot_daily_contributions(aggregates):
     """Plots daily commits in a bar chart"""
-    agg = (
-        data.groupby(pd.Grouper(key="committed_on", freq="1D"))["hash"]
-        .count()
-        .reset_index()
-    )
+    agg = aggregates.daily()[["committed_on", "hash"]]
 
     plot = (
         alt.Chart(agg)
@@ -371,18 +391,10 @@ def plot_daily_contributions(data):
     return plot
 
 
-def plot_inserts_deletions(data):
+def plot_inserts_deletions(aggregates):
     """Plots daily lines added/deleted in a bar chart"""
-    agg = data.copy()
-    agg["lines_deleted"] = -agg["lines_deleted"]
-    agg = (
-        agg.groupby(pd.Grouper(key="committed_on", freq="1D"))[
-            ["lines_added", "lines_deleted"]
-        ]
-        .sum()
-        .reset_index()
-        .melt(id_vars="committed_on")
-    )
+    agg = aggregates.daily()[["committed_on", "lines_added", "lines_deleted"]]
+    agg = agg.assign(lines_deleted=-agg["lines_deleted"]).melt(id_vars="committed_on")
 
     plot = (
         alt.Chart(agg)
@@ -404,17 +416,10 @@ def plot_inserts_deletions(data):
     return plot
 
 
-def plot_cum_commits(data):
+def plot_cum_commits(aggregates):
     """Plots cumulative commits for sidebar plot"""
-    added_commits_cumsum = (
-        data.groupby(pd.Grouper(key="committed_on", freq="1D"))["hash"]
-        .count()
-        .reset_index()
-        .groupby(pd.Grouper(key="committed_on", freq="1M"))
-        .sum()
-        .cumsum()
-        .reset_index()
-    )
+    monthly_commits = aggregates.monthly()[["committed_on", "hash"]]
+    added_commits_cumsum = monthly_commits.assign(hash=monthly_commits["hash"].cumsum())
 
     plot = (
         alt.Chart(added_commits_cumsum)
@@ -434,13 +439,9 @@ def plot_cum_commits(data):
     return plot
 
 
-def plot_commit_waffle(data):
+def plot_commit_waffle(aggregates):
     """Plots waffle-charte (github-like) with commits by dow/week"""
-    daily_commits = (
-        data.groupby(pd.Grouper(key="committed_on", freq="1D"))["hash"]
-        .count()
-        .reset_index()
-    )
+    daily_commits = aggregates.daily()[["committed_on", "hash"]]
     daily_commits = daily_commits.set_index("committed_on")
 
     min_date = min(daily_commits.index) - offsets.YearBegin()
@@ -490,44 +491,9 @@ def plot_commit_waffle(data):
     return plot
 
 
-def plot_cumulative_lines_by_contributor(data, n=20):
+def plot_cumulative_lines_by_contributor(aggregates, n=20):
     """Plots cumulative lines by contributor"""
-    top_n = (
-        data.groupby("author")["hash"]
-        .count()
-        .sort_values(ascending=False)[:n]
-        .index.tolist()
-    )
-
-    df_top_n_month = (
-        data[data["author"].isin(top_n)]
-        .groupby(["author", pd.Grouper(key="committed_on", freq="M")])["lines_added"]
-        .sum()
-        .reset_index()
-    )
-
-    min_month = df_top_n_month["committed_on"].min()
-    max_month = df_top_n_month["committed_on"].max()
-
-    idx = pd.MultiIndex.from_product(
-        [
-            pd.date_range(min_month, max_month, freq="M"),
-            df_top_n_month["author"].unique(),
-        ]
-    )
-    df_top_n_month = df_top_n_month.set_index(["committed_on", "author"])
-    df_top_n_month = df_top_n_month["lines_added"].reindex(idx, fill_value=0).to_frame()
-    df_top_n_month = df_top_n_month.rename_axis(
-        ["committed_on", "author"]
-    ).reset_index()
-    # Cumulative df
-    df_top_n_month = (
-        df_top_n_month.groupby(["author", "committed_on"])["lines_added"]
-        .sum()
-        .groupby(level=0)
-        .cumsum()
-        .reset_index()
-    )
+    df_top_n_month = aggregates.cumulative_lines_by_contributor(n)
 
     selection = alt.selection_single(on="mouseover")
 
@@ -580,17 +546,16 @@ def plot_lines_stats(data):
 
     selection = alt.selection_single(on="mouseover")
 
-    data_w_total_lines_df = data.copy()
+    # `data` holds the weekly totals and their running sums, see get_coin_stats
+    data_w_total_lines_df = data[["week", "cum_deletions", "cum_additions"]].rename(
+        columns={"cum_deletions": "deletions", "cum_additions": "additions"}
+    )
     data_w_total_lines_df["total_lines"] = (
         data_w_total_lines_df.additions + data_w_total_lines_df.deletions
     )
-    coin_aggregates_df = (
-        data_w_total_lines_df.groupby("week")
-        .sum()
-        .transform(lambda x: x.cumsum())
-        .reset_index()[["week", "deletions", "additions", "total_lines"]]
-        .melt(id_vars=["week"])
-    )
+    coin_aggregates_df = data_w_total_lines_df[
+        ["week", "deletions", "additions", "total_lines"]
+    ].melt(id_vars=["week"])
     # coin_aggregates_df["value"] = coin_aggregates_df.value.astype(float)
     domain = ["deletions", "additions", "total_lines"]
     range_ = ["red", "green", "grey"]
@@ -631,14 +596,10 @@ def plot_total_commits_(data):
 
     selection = alt.selection_single(on="mouseover")
 
-    results_df = data.copy()
-    weekly_totals = results_df.groupby("week").sum()
-    weekly_totals.columns = ["weekly_" + i for i in weekly_totals.columns]
-    cumulative_totals = results_df.groupby("week").sum().transform(lambda x: x.cumsum())
-    cumulative_totals.columns = ["cum_" + i for i in cumulative_totals.columns]
-    agg = pd.concat([weekly_totals, cumulative_totals], axis=1)
+    # `data` holds the weekly totals and their running sums, see get_coin_stats
+    agg = data.rename(columns={"total_commits": "weekly_total_commits"})
 
-    coin_aggregates_df = agg.reset_index()[
+    coin_aggregates_df = agg[
         ["week", "cum_total_commits", "weekly_total_commits"]
     ].melt(id_vars=["week"])
     domain = ["weekly_total_commits", "cum_total_commits"]
@@ -736,11 +697,8 @@ def plot_coin_stats(data):
 
 def plot_stargazers_by_repo(data):
     selection = alt.selection_single(on="mouseover")
-    results_df = data.copy()
-    results_df["stargazer_cumsum"] = results_df.groupby(by=["repo_path"])[
-        "stargazer_size"
-    ].transform(lambda x: x.cumsum())
-    melted_df = results_df[
+    # `data` already holds the running sum per repo, see coin_stats.stargazers_by_repo
+    melted_df = data[
         ["week", "stargazer_cumsum", "stargazer_size", "repo_path"]
     ].melt(id_vars=["week", "repo_path"])
     # melted_df = results_df.melt(id_vars=["week"])
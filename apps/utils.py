@@ -8,7 +8,22 @@ import streamlit.components.v1 as components
 import json
 from datetime import datetime
 from pathlib import Path
-from .repo import get_all_commits
+from . import queries
+from .coin_stats import load_coin_stats
+from .commit_store import CommitStore
+from .graph_index import GRAPH_COMPACT_PATH, CompactGraph
+from .graph_render import (
+    MAX_HOVER_REPOS,
+    RenderedGraphCache,
+    graph_columns,
+    graph_elements,
+    graph_style,
+    options_hash,
+    options_json,
+    render_graph_html,
+)
+from .repo import read_commits_parquet, typed_commit_frame
+from .stats_cache import RepoStatsCache
 
 
 DATE_COLUMN = 'last_updated'
@@ -103,21 +118,31 @@ def get_description(data, coin_choice):
 
 
 ####GITHUB
+# Clones and traversed histories, kept across reruns and restarts
+COMMIT_STORE = CommitStore(max_workers=os.cpu_count() or 1)
+
+
 @st.cache
-def get_repo_data(repo_path, since = None, to = None, first_n_commits = None):
+def get_repo_data(repo_path, since = None, to = None, first_n_commits = None, backend = "pydriller"):
     """
-    Retrieve commit history from remote source or local .json file
+    Retrieve commit history from remote source or local .json/.parquet file
     Args:
         repo_path: File st.text_input or st.file_uploader
+        backend: "pydriller", or "git" to read the stats from `git log --numstat`
     Returns:
-        pandas.DataFrame: A dataframae containing the commit history
+        pandas.DataFrame: A dataframae containing the commit history, with typed
+            columns (see `repo.typed_commit_frame`)
     """
     if isinstance(repo_path, UploadedFile):
-        data = pd.read_json(repo_path, orient="records")
+        if repo_path.name.endswith(".parquet"):
+            data = read_commits_parquet(repo_path)
+        else:
+            data = pd.read_json(repo_path, orient="records")
+        data = typed_commit_frame(data)
     else:
-        commits = get_all_commits(repo_path, since = since, to = to, first_n_commits = first_n_commits)
-        if len(commits) == 0:
-            data = pd.DataFrame({"hash":pd.Series(['NA'], dtype='str'),
+        data = COMMIT_STORE.get_commits(repo_path, since = since, to = to, first_n_commits = first_n_commits, backend = backend)
+        if len(data) == 0:
+            data = typed_commit_frame(pd.DataFrame({"hash":pd.Series(['NA'], dtype='str'),
             "author":pd.Series(['NA'],dtype='str'),
             "committed_on":pd.date_range(datetime.now().date(), periods=1, freq='D'),
             "authored_on":pd.date_range(datetime.now().date(), periods=1, freq='D'),
@@ -125,16 +150,8 @@ def get_repo_data(repo_path, since = None, to = None, first_n_commits = None):
             "lines_deleted":pd.Series([0],dtype='int'),
             "files_touched":pd.Series([0],dtype='int'),
             "is_merge":pd.Series([0],dtype='int'),
-            "message":pd.Series(['NA'],dtype='str')})
+            "message":pd.Series(['NA'],dtype='str')}))
 
-        else:
-            data = pd.DataFrame(commits)
-            
-
-    # Convert timestamps
-    data[["committed_on", "authored_on"]] = data[["committed_on", "authored_on"]].apply(
-        pd.to_datetime
-    )
     data['total_lines'] = data['lines_added'] + data['lines_deleted']
 
     return data
@@ -256,11 +273,16 @@ credentials = service_account.Credentials.from_service_account_info(
 )
 client = bigquery.Client(credentials=credentials)
 
+
 # Perform query.
 # Uses st.cache to only rerun when the query changes or after 10 min.
 @st.experimental_memo 
-def run_query(query):
-    query_job = client.query(query)
+def run_query(query, params=()):
+    """Run `query` with `params`, (name, type, value) triples, a tuple value being an ARRAY"""
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=queries.bigquery_parameters(params)
+    )
+    query_job = client.query(query, job_config=job_config)
     # rows_raw = query_job.result()
     result_df = query_job.result().to_dataframe()
     # Convert to list of dicts. Required for st.cache to hash the return value.
@@ -268,40 +290,74 @@ def run_query(query):
     return result_df
 
 
+# Per repo_path cache of the stats table, shared by every session
+STATS_CACHE = RepoStatsCache()
+
+
+def _query_repos_stats(repo_paths):
+    return run_query(*queries.repo_stats_query(repo_paths))
 
 
 def get_coin_multiple_repos_stats(repo_paths):
+    """Weekly stats of `repo_paths` ('owner/name'), only querying the ones not cached locally"""
     if len(repo_paths) > 0:
-        query = f''' SELECT * FROM `steady-voltage-236500.github_repo_commits.github_repo_stats_historyv2` where repo_path in ({",".join(repo_paths)})'''
-        results_df = run_query(query)
+        results_df = STATS_CACHE.get(repo_paths, _query_repos_stats)
         return results_df
-    return pd.DataFrame()
+    return pd.DataFrame(columns=queries.STATS_CHART_COLUMNS)
+
+
+def get_coin_weekly_totals(repo_paths, start=None, end=None):
+    """Stats of `repo_paths` summed per week by the warehouse, optionally within [start, end)"""
+    if len(repo_paths) > 0:
+        return run_query(*queries.weekly_totals_query(repo_paths, start, end))
+    return pd.DataFrame(columns=["week"] + queries.STATS_SUM_COLUMNS)
+
+
+@st.experimental_memo(ttl=3600)
+def load_materialized_coin_stats(coin_id):
+    return load_coin_stats(coin_id)
 
 
 ###### GRAPH UTILS
 
 from operator import itemgetter
 
-def knn(graph, node, n):
+def knn(graph, node, n, index = None):
+    if index is not None:
+        return index.nearest(node, n)
     return [e[1] for e in sorted(graph.edges(node,data=True),key= lambda x: x[2]['weight'],reverse=True)[:n]]
     # return list(map(itemgetter(1),
     #                 sorted([(e[2]['weight'], e[1])
     #                         for e in graph.edges(node, data=True)])[:n]))
 # knn(MG,  "Fantom", 5)
 
+GRAPH_PICKLE_PATH = './data/graph_contributor_edges.pkl'
+
 @st.experimental_memo
 def load_netowrkxgraph():
     import networkx as nx
-    MG = nx.read_gpickle('./data/graph_contributor_edges.pkl')
+    MG = nx.read_gpickle(GRAPH_PICKLE_PATH)
     return MG
 
+# Memory-mapped, read-only arrays: one instance per process instead of copies
+# out of the memo, and pages shared with the other processes
+@st.experimental_singleton
+def load_compact_graph():
+    def load_graph():
+        import networkx as nx
+        return nx.read_gpickle(GRAPH_PICKLE_PATH)
+    return CompactGraph.for_graph(GRAPH_PICKLE_PATH, load_graph, GRAPH_COMPACT_PATH)
+
 # Build subgraph containing a subset of the nodes, and edges between those nodes
-def get_subgraph(G, top_n_nodes = None, nearest_nodes = None, n = 20):
+def get_subgraph(G, top_n_nodes = None, nearest_nodes = None, n = 20, index = None):
     if top_n_nodes:
-        nodes = [index for index, values in  sorted(G.nodes(data=True),key= lambda x: x[1]['stargazers_count'],reverse=True)[:top_n_nodes]]
+        if index is not None:
+            nodes = index.top_by_stars(top_n_nodes)
+        else:
+            nodes = [index for index, values in  sorted(G.nodes(data=True),key= lambda x: x[1]['stargazers_count'],reverse=True)[:top_n_nodes]]
         subgraph = G.subgraph(nodes)
     if nearest_nodes:
-        nodes = knn(G,  nearest_nodes, n)
+        nodes = knn(G,  nearest_nodes, n, index = index)
         nodes.extend([nearest_nodes])
         subgraph = G.subgraph(nodes)
     
@@ -363,119 +419,79 @@ options = '''var options = {
   }
 }'''
 
-from pyvis.network import Network
 import networkx as nx
-from pyvis import network as net
 
-def draw_graph3(networkx_graph,notebook=True,output_filename='graph.html',show_buttons=False,only_physics_buttons=False,
-                height=None,width=None,bgcolor=None,font_color=None, color_node = None, pyvis_options=None):
+def draw_graph3(networkx_graph,notebook=True,output_filename=None,show_buttons=False,only_physics_buttons=False,
+                height=None,width=None,bgcolor=None,font_color=None, color_node = None, pyvis_options=None,
+                max_repos=MAX_HOVER_REPOS):
     """
     This function accepts a networkx graph object,
-    converts it to a pyvis network object preserving its node and edge attributes,
-    and both returns and saves a dynamic network visualization.
-    Valid node attributes include:
-        "size", "value", "title", "x", "y", "label", "color".
-        (For more info: https://pyvis.readthedocs.io/en/latest/documentation.html#pyvis.network.Network.add_node)
-    Valid edge attributes include:
-        "arrowStrikethrough", "hidden", "physics", "title", "value", "width"
-        (For more info: https://pyvis.readthedocs.io/en/latest/documentation.html#pyvis.network.Network.add_edge)
+    converts it to the vis.js nodes and edges pyvis would build from its node and edge attributes,
+    and returns (and saves if output_filename is given) the HTML of a dynamic network visualization,
+    rendered with components/graph_template.html.
+    Nodes need "stargazers_count", "forks_count" and "repos" attributes, edges a "weight".
     Args:
         networkx_graph: The graph to convert and display
-        notebook: Display in Jupyter?
-        output_filename: Where to save the converted network
-        show_buttons: Show buttons in saved version of network?
-        only_physics_buttons: Show only buttons controlling physics of network?
+        notebook: Display in Jupyter? (unused, kept for compatibility)
+        output_filename: Where to save the converted network, nothing is written if None
+        show_buttons: Show buttons in saved version of network? (unused)
+        only_physics_buttons: Show only buttons controlling physics of network? (unused)
         height: height in px or %, e.g, "750px" or "100%
         width: width in px or %, e.g, "750px" or "100%
         bgcolor: background color, e.g., "black" or "#222222"
         font_color: font color,  e.g., "black" or "#222222"
+        color_node: Node highlighted in red
         pyvis_options: provide pyvis-specific options (https://pyvis.readthedocs.io/en/latest/documentation.html#pyvis.options.Options.set)
+        max_repos: Repos listed in the hover text of a node
     """
+    return draw_graph_columns(graph_columns(networkx_graph), output_filename=output_filename, height=height, width=width,
+                              bgcolor=bgcolor, font_color=font_color, color_node=color_node, pyvis_options=pyvis_options,
+                              max_repos=max_repos)
 
-    # import
-    from pyvis import network as net
-    import numpy as np
-
-    # make a pyvis network
-    network_class_parameters = {"notebook": notebook, "height": height, "width": width, "bgcolor": bgcolor, "font_color": font_color}
-    pyvis_graph = net.Network(**{parameter_name: parameter_value for parameter_name, parameter_value in network_class_parameters.items() if parameter_value})
-    pyvis_graph.hrepulsion(central_gravity=0, spring_length = 400)
-    # for each node and its attributes in the networkx graph
-    max_stars = max([node_attrs['stargazers_count'] for node,node_attrs in networkx_graph.nodes(data=True)])
-    for node,node_attrs in networkx_graph.nodes(data=True):
-        node_size = np.log10(int(node_attrs['stargazers_count']))*3
-        # node_size = node_attrs['stargazers_count'] / max_stars
-        # pyvis_graph.add_node(node,size = node_size,**node_attrs)
-        hover_text = f"<h1>{node}</h1>"
-        hover_text += f" <strong>Stargazers:{node_attrs['stargazers_count']:,.0f}<strong><br>"
-        hover_text += f" <strong>Forks:{node_attrs['forks_count']:,.0f}</strong><br>"
-        hover_text += ' <h2>Repos:</h2><br>' + '<br>'.join([f'<font size="1">{repo}</font>' for repo in node_attrs["repos"]])
-        if node == color_node:
-            pyvis_graph.add_node(node, label = node, title = hover_text, size = node_size, color = 'red', opacity = 0.3)
-        else:    
-            pyvis_graph.add_node(node, label = node, title = hover_text, size = node_size)
-    max_edge_weigth = max([x[2]['weight'] for x in networkx_graph.edges(data=True)])
-    # for each edge and its attributes in the networkx graph
-    for source,target,edge_attrs in networkx_graph.edges(data=True):
-        # if value/width not specified directly, and weight is specified, set 'value' to 'weight'
-        if not 'value' in edge_attrs and not 'width' in edge_attrs and 'weight' in edge_attrs:
-            # place at key 'value' the weight of the edge
-            edge_attrs['width'] = edge_attrs['weight'] / (max_edge_weigth*2)
-            edge_attrs['title'] = f"<strong>{source} & {target} share {edge_attrs['weight']} git contributors</strong>" 
-            edge_attrs['value'] = f"{source} & {target} share {edge_attrs['weight']} git contributors" 
-            edge_attrs['label'] = f"Shared Contributors={edge_attrs['weight']}"
-        # add the edge
-        pyvis_graph.add_edge(source,target,**edge_attrs)
-    
-    neighbor_map = pyvis_graph.get_adj_list()
-    # max_edges = max([len(i) for i in neighbor_map.values()])
-    # max_edges = max([len(i) for i in neighbor_map.values()])
-    for node in pyvis_graph.nodes:
-        # node['value'] = len(neighbor_map[node['id']])/ max_edges
-        node['title'] +=  f' <strong>Neighboring Tokens: {len(neighbor_map[node["id"]]) }</strong><br>'
-        
-
-    # pyvis-specific options
-    if pyvis_options:
-        pyvis_graph.set_options(pyvis_options)
-
-    # turn buttons on
-    # if show_buttons:
-    #     if only_physics_buttons:
-    #         pyvis_graph.show_buttons(filter_=['physics'])
-    #     else:
-    #         pyvis_graph.show_buttons()
 
-    
+def draw_graph_columns(columns, output_filename=None, height=None, width=None, bgcolor=None, font_color=None,
+                       color_node=None, pyvis_options=None, max_repos=MAX_HOVER_REPOS):
+    """
+    `draw_graph3` of a graph given as columns (see `graph_render.graph_columns`), all the
+    nodes and edges being built at once from the arrays.
+    """
+    nodes, edges = graph_elements(columns, color_node = color_node, max_repos = max_repos)
+    if font_color:
+        for node in nodes:
+            node["font"] = {"color": font_color}
+    html = render_graph_html(
+        nodes,
+        edges,
+        options_json(pyvis_options),
+        height = f"{height}px" if isinstance(height, int) else (height or "500px"),
+        width = f"{width}px" if isinstance(width, int) else (width or "500px"),
+        bgcolor = bgcolor or "#ffffff",
+    )
+    if output_filename:
+        with open(output_filename, "w", encoding="utf-8") as f:
+            f.write(html)
+    return html
 
-    # return and also save
-    # return pyvis_graph.show(output_filename)
-    return pyvis_graph.write_html(output_filename)
+
+RENDERED_GRAPHS = RenderedGraphCache(max_entries=64)
+
+def get_graph_html(coin_choice, n, pyvis_options=options):
+    """HTML of the graph of the n nearest tokens to coin_choice, rendered once per (coin, n, options)"""
+    def render():
+        graph = load_compact_graph()
+        columns = graph.subgraph_columns(graph.nearest(coin_choice, n) + [coin_choice])
+        return draw_graph_columns(columns, color_node = coin_choice, width = 1000, height = 1000, pyvis_options=pyvis_options)
+    return RENDERED_GRAPHS.get((coin_choice, n, options_hash(pyvis_options)), render)
 
 
 def get_subgraph_info(coin_choice, n):
-    MG = load_netowrkxgraph()
-    subgraph = get_subgraph(MG, nearest_nodes = coin_choice, n = n)
-    if len(subgraph) > 0:
-        # Save and read graph as HTML file (on Streamlit Sharing)
-        try:
-            path = '/tmp'
-            graph = draw_graph3(subgraph, output_filename= f'{path}/pyvis_graph.html', color_node = coin_choice,width = 1000, height = 1000, show_buttons=False,only_physics_buttons=True, pyvis_options=options)
-            HtmlFile = open(f'{path}/pyvis_graph.html', 'r', encoding='utf-8')
-
-        # Save and read graph as HTML file (locally)
-        except:
-            path = '/html_files'
-            graph = draw_graph3(subgraph, output_filename= f'{path}/pyvis_graph.html',color_node = str(coin_choice), show_buttons=False,only_physics_buttons=True,  pyvis_options=options)
-            HtmlFile = open(f'{path}/pyvis_graph.html', 'r', encoding='utf-8')
-
-        # Load HTML file in HTML component for display on Streamlit page
+    if coin_choice in load_compact_graph():
+        html = get_graph_html(coin_choice, n)
+        # Load HTML in HTML component for display on Streamlit page
         st.markdown(f"Showing {n} Nearest Nodes to {coin_choice} based on overlapping contributor counts")
-        with open("./components/style.css") as f:
-            # col1, col2, col3 = st.columns([400,1000,1])
-            # with col2:
-            st.markdown('<style>{}</style>'.format(f.read()), unsafe_allow_html=True)
-            components.html(HtmlFile.read(), width= 1000, height=1000)
+        # col1, col2, col3 = st.columns([400,1000,1])
+        # with col2:
+        st.markdown('<style>{}</style>'.format(graph_style()), unsafe_allow_html=True)
+        components.html(html, width= 1000, height=1000)
     else:
         st.info(f"This token is not part of the network graph, try picking another token to see the graph (ex. Ethereum)")
-    
@@ -0,0 +1,64 @@
+import pandas as pd
+
+from apps.contributor_graph import build_contributor_graph, contributor_logins
+
+INVALID_REPO_ROW = {
+    "name": "beta",
+    "repo": "/beta/broken",
+    "contributors": "Invalid Repo",
+    "language": "Invalid Repo",
+    "stargazers_count": "Invalid Repo",
+    "watchers_count": "Invalid Repo",
+    "forks_count": "Invalid Repo",
+}
+
+
+def _repos_df(rows):
+    return pd.DataFrame(
+        [
+            {
+                "name": "alpha",
+                "repo": "/alpha/core",
+                "contributors": str({"login": ["ann", "bob"]}),
+                "language": "Rust",
+                "stargazers_count": 10,
+                "watchers_count": 10,
+                "forks_count": 2,
+            },
+            {
+                "name": "beta",
+                "repo": "/beta/node",
+                "contributors": str({"login": ["bob", "dependabot[bot]"]}),
+                "language": "Go",
+                "stargazers_count": 5,
+                "watchers_count": 5,
+                "forks_count": 1,
+            },
+        ]
+        + rows
+    )
+
+
+def test_contributor_logins_of_invalid_repo():
+    assert contributor_logins("Invalid Repo") is None
+    assert contributor_logins(str({"login": ["ann"]})) == ["ann"]
+
+
+def test_invalid_repo_rows_are_skipped():
+    nodes, edges = build_contributor_graph(_repos_df([INVALID_REPO_ROW]))
+    expected_nodes, expected_edges = build_contributor_graph(_repos_df([]))
+
+    pd.testing.assert_frame_equal(nodes, expected_nodes)
+    pd.testing.assert_frame_equal(edges, expected_edges)
+    assert nodes.loc["beta", "repos"] == ["/beta/node"]
+    assert nodes.loc["beta", "stargazers_count"] == 5
+    assert edges[["src", "dst", "weight"]].values.tolist() == [[0, 1, 1]]
+
+
+def test_unparseable_counts_are_zero():
+    row = dict(INVALID_REPO_ROW, contributors=str({"login": ["ann"]}))
+    nodes, _ = build_contributor_graph(_repos_df([row]))
+
+    assert nodes.loc["beta", "repo_count"] == 2
+    assert nodes.loc["beta", "stargazers_count"] == 5
+    assert nodes.loc["beta", "forks_count"] == 1